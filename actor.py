@@ -1,8 +1,9 @@
 import logging
-from telnetlib import IAC
-from typing import Dict, Mapping, Optional, Type
+from typing import Dict, Iterable, Mapping, Optional, Type
+import numpy as np
 import pygame
-from tomlkit import key
+
+from assets import AssetManager
 
 from base import (
     CollisionableActor,
@@ -11,9 +12,12 @@ from base import (
     IActorCollisionEvent,
     ICamera,
     IComponent,
+    ICullable,
     IEvent,
+    IEventType,
     IKeyDownEvent,
     IPawn,
+    IPoolable,
 )
 from event import (
     EVENT_TYPE,
@@ -22,40 +26,82 @@ from event import (
     ActorDestructEvent,
     EventManager,
     GuitarHitEvent,
+    KeyDownEvent,
 )
+from metronome import BeatGrid, MetronomeScheduler
+from sprite_batch import SpriteBatch
 
 
 class MetronomeActor(IActor):
-    def __init__(self, bpm: int = 120):
+    """
+    按节拍网格在每一拍生成金币。传入 scheduler 时点击声由音频输出流按采样位置播放,
+    时间取自音频时钟; 否则用累计的帧时间 (不清零, 不会丢失超出的部分) 和 pygame 播放。
+    """
+
+    ASSETS = ("metronome.wav",)
+
+    def __init__(
+        self,
+        bpm: int = 120,
+        scheduler: Optional[MetronomeScheduler] = None,
+        bouns_batch: Optional["BounsBatchActor"] = None,
+    ):
         self._component_dict: Dict[Type[IComponent], IComponent] = {}
-        self._bpm = bpm
-        self._ms_after_prev_click = 0
-        self._click_sound = pygame.mixer.Sound("metronome.wav")
-        self._sec_beat_time = 60 / self._bpm
+        self._scheduler = scheduler
+        # 传入时金币生成在数组存储中, 而不是每拍创建一个 BounsActor
+        self._bouns_batch = bouns_batch
+        self._beat_grid = BeatGrid(bpm) if scheduler is None else scheduler.grid
+        self._time_ms = 0.0
+        self._next_beat = 0
+        self._click_sound = (
+            AssetManager.get_sound("metronome.wav") if scheduler is None else None
+        )
 
     def _get_component_dict(self) -> Dict[Type[IComponent], IComponent]:
         return self._component_dict
 
-    def update(self, delta_time_ms: int):
-        super().update(delta_time_ms)
-        self._ms_after_prev_click += delta_time_ms
-        if self._ms_after_prev_click >= self._sec_beat_time * 1000:
+    def on_destroy(self):
+        if self._click_sound is not None:
+            AssetManager.release("metronome.wav")
+
+    def get_beat_grid(self) -> BeatGrid:
+        return self._beat_grid
+
+    def get_time_ms(self) -> float:
+        """节拍网格上的当前时间"""
+        return self._time_ms
+
+    def update_self(self, delta_time_ms: int):
+        if self._scheduler is None:
+            self._time_ms += delta_time_ms
+        else:
+            self._time_ms = self._scheduler.get_time_ms()
+        while self._beat_grid.beat_time_ms(self._next_beat) <= self._time_ms:
             logging.info("playing click")
-            EventManager.post_event(
-                ActorCreateEvent(BounsActor, position=pygame.Vector2(500, -100))
-            )
-            self._ms_after_prev_click = 0
-            self._click_sound.play()
+            if self._bouns_batch is None:
+                EventManager.post_event(
+                    ActorCreateEvent(BounsActor, position=pygame.Vector2(500, -100))
+                )
+            else:
+                self._bouns_batch.spawn_bouns(pygame.Vector2(500, -100))
+            self._next_beat += 1
+            if self._click_sound is not None:
+                self._click_sound.play()
 
 
 class PlayerActor(IPawn, EventHandleAble, CollisionableActor):
+    ASSETS = ("player.png",)
+
     def __init__(self) -> None:
         super().__init__()
         self._position = pygame.Vector2(0, 0)
-        self._sprite = pygame.image.load("player.png")
+        # 上一个模拟步的位置, 渲染时插值用
+        self._previous_position = pygame.Vector2(self._position)
+        self._sprite = AssetManager.get_image("player.png")
         self._component_dict: Dict[Type[IComponent], IComponent] = {}
+        # 速度单位为 像素/ms, 重力加速度为 像素/ms², 与步长无关
         self._velocity = pygame.Vector2(0, 0)
-        self._gravity = pygame.Vector2(0, 0.1)
+        self._gravity = pygame.Vector2(0, 0.1 / (1000 / 60))
         self._in_air = False
 
     def _get_component_dict(self) -> Dict[Type[IComponent], IComponent]:
@@ -64,6 +110,9 @@ class PlayerActor(IPawn, EventHandleAble, CollisionableActor):
     def get_position(self) -> pygame.Vector2:
         return self._position
 
+    def on_destroy(self):
+        AssetManager.release("player.png")
+
     def jump(self):
         logging.info("jumping")
         self._velocity.y = -10
@@ -81,14 +130,23 @@ class PlayerActor(IPawn, EventHandleAble, CollisionableActor):
         logging.info("guitar hit")
         self.jump()
 
+    def get_handled_event_types(self) -> Iterable[IEventType]:
+        return (EVENT_TYPE.KEY_DOWN, EVENT_TYPE.GUIATR_HIT)
+
     def handle_event(self, event: IEvent):
-        if isinstance(event, IKeyDownEvent):
-            self._handle_key_down_event(event)
-        elif isinstance(event, GuitarHitEvent):
-            self._handle_guitar_hit_event(event)
+        match event.get_type():
+            case EVENT_TYPE.KEY_DOWN:
+                assert isinstance(event, KeyDownEvent)
+                self._handle_key_down_event(event)
+            case EVENT_TYPE.GUIATR_HIT:
+                assert isinstance(event, GuitarHitEvent)
+                self._handle_guitar_hit_event(event)
+
+    def update_self(self, delta_time_ms: int):
+        self._previous_position.update(self._position)
         t = delta_time_ms
         self._position += self._velocity * t
-        self._velocity += self._gravity
+        self._velocity += self._gravity * t
         if self._position.y >= 0:
             self._velocity.y = 0
             self._position.y = 0
@@ -106,27 +164,40 @@ class PlayerActor(IPawn, EventHandleAble, CollisionableActor):
         return pygame.Rect(
             rect.centerx - collision_size // 2,
             rect.top - collision_size + 20,
-            collision_size,pasuspender -- audacity
+            collision_size,
             collision_size,
         )
 
-    def draw(self, surface: pygame.Surface, camera: ICamera):
-        super().draw(surface, camera)
-
+    def draw_self(self, surface: pygame.Surface, camera: ICamera):
         if camera.is_rect_visiable(
             self._sprite.get_rect().move(self._position.x, self._position.y)
         ):
-            surface.blit(self._sprite, camera.world_to_screen(self._position))
+            position = camera.interpolate(self._previous_position, self._position)
+            surface.blit(self._sprite, camera.world_to_screen(position))
+
 
+class BounsActor(CollisionableActor, EventHandleAble, IPoolable, ICullable):
+    ASSETS = ("bouns.png", "coin.wav")
 
-class BounsActor(CollisionableActor, EventHandleAble):
     def __init__(self, position: pygame.Vector2) -> None:
         super().__init__()
-        self._position = position
-        self._sprite = pygame.image.load("bouns.png")
+        self._sprite = AssetManager.get_image("bouns.png")
         self._component_dict: Dict[Type[IComponent], IComponent] = {}
+        self._sound = AssetManager.get_sound("coin.wav")
+        self.reset(position)
+
+    def reset(self, position: pygame.Vector2):
+        self._position = position
+        self._previous_position = pygame.Vector2(position)
         self._velocity = pygame.Vector2(-0.1, 0)
-        self._sound = pygame.mixer.Sound("coin.wav")
+        self._destroying = False
+
+    def _destroy(self):
+        # 每次生命周期只投递一次销毁事件, 避免对象被复用后收到旧的销毁事件
+        if self._destroying:
+            return
+        self._destroying = True
+        EventManager.post_event(ActorDestructEvent(self))
 
     def _get_component_dict(self) -> Dict[Type[IComponent], IComponent]:
         return self._component_dict
@@ -134,19 +205,23 @@ class BounsActor(CollisionableActor, EventHandleAble):
     def get_position(self) -> pygame.Vector2:
         return self._position
 
-    def update(self, delta_time_ms: int):
-        self._position += self._velocity * delta_time_ms
+    def on_destroy(self):
+        for path in self.ASSETS:
+            AssetManager.release(path)
 
-    def draw(self, surface: pygame.Surface, camera: ICamera):
-        super().draw(surface, camera)
+    def update_self(self, delta_time_ms: int):
+        self._previous_position.update(self._position)
+        self._position += self._velocity * delta_time_ms
 
+    def draw_self(self, surface: pygame.Surface, camera: ICamera):
         if camera.is_rect_visiable(
             self._sprite.get_rect().move(self._position.x, self._position.y)
         ):
-            surface.blit(self._sprite, camera.world_to_screen(self._position))
-        else:
-            logging.info("cleaning up bouns")
-            EventManager.post_event(ActorDestructEvent(self))
+            position = camera.interpolate(self._previous_position, self._position)
+            surface.blit(self._sprite, camera.world_to_screen(position))
+
+    def get_world_rect(self) -> pygame.Rect:
+        return self._sprite.get_rect().move(self._position.x, self._position.y)
 
     def get_collision_rect(self) -> pygame.Rect:
         sprite_size = self._sprite.get_size()
@@ -161,13 +236,53 @@ class BounsActor(CollisionableActor, EventHandleAble):
             collision_size,
         )
 
+    def get_handled_event_types(self) -> Iterable[IEventType]:
+        return (EVENT_TYPE.ACTOR_COLLISION,)
+
     def handle_event(self, event: IEvent):
+        # EventBus 只会把涉及自己的碰撞事件发过来
         match event.get_type():
             case EVENT_TYPE.ACTOR_COLLISION:
-                assert isinstance(event, IActorCollisionEvent)
-                if self not in event.get_actors():
+                if self._destroying:
                     return
                 self._sound.play()
-                EventManager.post_event(ActorDestructEvent(self))
+                self._destroy()
             case _:
                 pass
+
+
+class BounsBatchActor(SpriteBatch):
+    """以数组存储的 BounsActor, 适合屏幕上有大量金币的情况"""
+
+    ASSETS = BounsActor.ASSETS
+
+    def __init__(self, capacity: int = 256) -> None:
+        super().__init__([AssetManager.get_image("bouns.png")], capacity)
+        self._sound = AssetManager.get_sound("coin.wav")
+        self._velocity = (-0.1, 0)
+
+    def on_destroy(self):
+        for path in self.ASSETS:
+            AssetManager.release(path)
+
+    def spawn_bouns(self, position: pygame.Vector2) -> int:
+        return self.spawn((position.x, position.y), self._velocity)
+
+    def get_collision_bounds(self) -> np.ndarray:
+        """与 BounsActor.get_collision_rect 相同: 精灵底部中央 4x4 的区域"""
+        bounds = self.get_bounds()
+        collision_size = 4
+        center_x = np.floor((bounds[:, 0] + bounds[:, 2]) / 2) - collision_size // 2
+        bottom = bounds[:, 3]
+        return np.stack(
+            (center_x, bottom - collision_size, center_x + collision_size, bottom),
+            axis=1,
+        )
+
+    def process_collision(self, rects: Iterable[pygame.Rect]):
+        bounds = self.get_collision_bounds()
+        for rect in rects:
+            hit = np.flatnonzero(self.query_rect(rect, bounds))
+            if len(hit):
+                self._sound.play()
+                self.despawn(hit)
@@ -0,0 +1,119 @@
+from typing import Dict, Iterator, List, Optional, Type
+
+from base import IActor
+from capabilities import CAPABILITY, get_capabilities
+
+
+class ActorStore:
+    """
+    下标稳定的 actor 存储: 删除只把槽位置空并放入空闲列表, 新 actor 优先复用空闲槽位,
+    增删都是 O(1), 其他 actor 的下标不变。
+    遍历时只访问开始遍历时已存在的 actor (遍历中新增的 actor 即使复用了前面的空闲槽位
+    也会跳过), 遍历过程中增删 actor 是安全的。
+    """
+
+    def __init__(self) -> None:
+        self._slots: List[Optional[IActor]] = []
+        # 每个槽位当前 actor 的加入序号, 遍历据此跳过遍历开始后加入的 actor
+        self._add_orders: List[int] = []
+        self._add_count = 0
+        self._free_slots: List[int] = []
+        self._indexes: Dict[IActor, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._indexes)
+
+    def __contains__(self, actor: IActor) -> bool:
+        return actor in self._indexes
+
+    def __iter__(self) -> Iterator[IActor]:
+        slots = self._slots
+        add_orders = self._add_orders
+        add_count = self._add_count
+        for index in range(len(slots)):
+            actor = slots[index]
+            if actor is not None and add_orders[index] < add_count:
+                yield actor
+
+    def add(self, actor: IActor) -> int:
+        if actor in self._indexes:
+            raise ValueError(f"actor already added: {actor}")
+        if self._free_slots:
+            index = self._free_slots.pop()
+            self._slots[index] = actor
+            self._add_orders[index] = self._add_count
+        else:
+            index = len(self._slots)
+            self._slots.append(actor)
+            self._add_orders.append(self._add_count)
+        self._add_count += 1
+        self._indexes[actor] = index
+        return index
+
+    def remove(self, actor: IActor) -> bool:
+        """actor 不在存储中时返回 False, 重复删除是安全的"""
+        index = self._indexes.pop(actor, None)
+        if index is None:
+            return False
+        self._slots[index] = None
+        self._free_slots.append(index)
+        return True
+
+    def get_index(self, actor: IActor) -> int:
+        return self._indexes[actor]
+
+    def get(self, index: int) -> Optional[IActor]:
+        return self._slots[index]
+
+
+class ActorPool:
+    """
+    回收被销毁的 IPoolable actor, 创建同类型 actor 时调用 reset 复用。
+    回收的 actor 在 flush 之后才能被复用: 游戏循环在处理完一帧的事件后调用 flush,
+    保证同一批事件中引用旧 actor 的事件不会作用到复用后的对象上。
+    """
+
+    def __init__(self, max_size_per_type: int = 256) -> None:
+        self._max_size_per_type = max_size_per_type
+        self._free: Dict[Type[IActor], List[IActor]] = {}
+        self._pending: List[IActor] = []
+        # 各类型等待 flush 的数量, 与空闲数一起受 max_size_per_type 限制
+        self._pending_counts: Dict[Type[IActor], int] = {}
+        self._poolable_types: Dict[Type[IActor], bool] = {}
+
+    def is_poolable(self, actor_type: Type[IActor]) -> bool:
+        poolable = self._poolable_types.get(actor_type)
+        if poolable is None:
+            poolable = CAPABILITY.POOLABLE in get_capabilities(actor_type)
+            self._poolable_types[actor_type] = poolable
+        return poolable
+
+    def acquire(self, actor_type: Type[IActor], **kwargs) -> IActor:
+        free = self._free.get(actor_type)
+        if free:
+            actor = free.pop()
+            actor.reset(**kwargs)  # type: ignore
+            return actor
+        return actor_type(**kwargs)
+
+    def release(self, actor: IActor) -> bool:
+        """返回 False 表示不回收, 调用方应照常销毁"""
+        actor_type = type(actor)
+        if not self.is_poolable(actor_type):
+            return False
+        free = self._free.setdefault(actor_type, [])
+        pending_count = self._pending_counts.get(actor_type, 0)
+        if len(free) + pending_count >= self._max_size_per_type:
+            return False
+        self._pending.append(actor)
+        self._pending_counts[actor_type] = pending_count + 1
+        return True
+
+    def flush(self):
+        for actor in self._pending:
+            self._free[type(actor)].append(actor)
+        self._pending.clear()
+        self._pending_counts.clear()
+
+    def get_free_count(self, actor_type: Type[IActor]) -> int:
+        return len(self._free.get(actor_type, ()))
@@ -0,0 +1,131 @@
+import logging
+import os
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Union
+
+import pygame
+
+Asset = Union[pygame.Surface, pygame.mixer.Sound]
+
+
+class AssetManager:
+    """
+    图片和声音按文件路径缓存, 每个文件只加载一次并在所有 actor 间共享。
+    get_image / get_sound 会增加引用计数, 不再使用时调用 release;
+    总大小超出预算时, 按最近最少使用的顺序淘汰引用计数为 0 的资源。
+    场景启动时用 preload 加载全部资源, 避免在帧中间读文件。
+    """
+
+    IMAGE_EXTENSIONS = (".png", ".jpg", ".bmp")
+    SOUND_EXTENSIONS = (".wav", ".ogg")
+
+    # 按最近使用排序, 最后一个是最近使用的
+    _assets: "OrderedDict[str, Asset]" = OrderedDict()
+    _ref_counts: Dict[str, int] = {}
+    _sizes: Dict[str, int] = {}
+    _memory_usage = 0
+    _memory_budget = 64 * 1024 * 1024
+
+    @classmethod
+    def set_memory_budget(cls, budget_bytes: int):
+        cls._memory_budget = budget_bytes
+        cls._evict()
+
+    @classmethod
+    def clear(cls):
+        """丢弃所有缓存, 仍持有资源的对象不受影响"""
+        cls._assets.clear()
+        cls._ref_counts.clear()
+        cls._sizes.clear()
+        cls._memory_usage = 0
+
+    @classmethod
+    def get_memory_usage(cls) -> int:
+        return cls._memory_usage
+
+    @classmethod
+    def get_ref_count(cls, path: str) -> int:
+        return cls._ref_counts.get(path, 0)
+
+    @classmethod
+    def is_loaded(cls, path: str) -> bool:
+        return path in cls._assets
+
+    @classmethod
+    def get_image(cls, path: str) -> pygame.Surface:
+        image = cls._acquire(path)
+        assert isinstance(image, pygame.Surface)
+        return image
+
+    @classmethod
+    def get_sound(cls, path: str) -> pygame.mixer.Sound:
+        sound = cls._acquire(path)
+        assert isinstance(sound, pygame.mixer.Sound)
+        return sound
+
+    @classmethod
+    def release(cls, path: str):
+        ref_count = cls._ref_counts[path] - 1
+        if ref_count < 0:
+            raise ValueError(f"asset released more than acquired: {path}")
+        cls._ref_counts[path] = ref_count
+        if ref_count == 0 and cls._memory_usage > cls._memory_budget:
+            cls._evict()
+
+    @classmethod
+    def preload(cls, paths: Iterable[str]) -> List[str]:
+        """加载并持有一次引用, 场景结束时对返回的路径调用 release"""
+        paths = list(dict.fromkeys(paths))
+        for path in paths:
+            cls._acquire(path)
+        return paths
+
+    @classmethod
+    def _acquire(cls, path: str) -> Asset:
+        asset = cls._assets.get(path)
+        if asset is None:
+            asset = cls._load(path)
+            cls._assets[path] = asset
+            cls._ref_counts.setdefault(path, 0)
+        else:
+            cls._assets.move_to_end(path)
+        cls._ref_counts[path] += 1
+        if cls._memory_usage > cls._memory_budget:
+            cls._evict()
+        return asset
+
+    @classmethod
+    def _load(cls, path: str) -> Asset:
+        logging.info(f"loading asset {path}")
+        extension = os.path.splitext(path)[1].lower()
+        if extension in cls.IMAGE_EXTENSIONS:
+            image = pygame.image.load(path)
+            # 转换为显示格式后 blit 更快, 需要先创建窗口
+            if pygame.display.get_surface() is not None:
+                image = image.convert_alpha()
+            size = image.get_width() * image.get_height() * image.get_bytesize()
+            asset: Asset = image
+        elif extension in cls.SOUND_EXTENSIONS:
+            sound = pygame.mixer.Sound(path)
+            frequency, sample_size, channels = pygame.mixer.get_init()
+            size = (
+                int(sound.get_length() * frequency) * channels * abs(sample_size) // 8
+            )
+            asset = sound
+        else:
+            raise ValueError(f"unknown asset type: {path}")
+        cls._sizes[path] = size
+        cls._memory_usage += size
+        return asset
+
+    @classmethod
+    def _evict(cls):
+        for path in list(cls._assets):
+            if cls._memory_usage <= cls._memory_budget:
+                return
+            if cls._ref_counts[path] > 0:
+                continue
+            logging.info(f"evicting asset {path}")
+            del cls._assets[path]
+            del cls._ref_counts[path]
+            cls._memory_usage -= cls._sizes.pop(path)
@@ -0,0 +1,402 @@
+"""
+GuitarInput 的音频输入后端:
+
+    PyAudioSource     声卡实时输入
+    WavFileSource     回放 WAV 文件
+    ArraySource       回放 NumPy 数组
+    GeneratorSource   回放逐块产生 NumPy 数组的生成器
+
+回放源可以按实时速度运行 (realtime=True), 也可以尽快运行;
+不调用 start 时用 process_until 按调用方的时钟逐步推进, 结果完全确定, 适合没有声卡的 CI。
+每个源都用 CallbackStats 记录回调耗时和 xrun (输入溢出 / 欠载)。
+"""
+
+import threading
+import time
+import wave
+from typing import Callable, Iterable, Iterator, Optional, Protocol
+
+import numpy as np
+from numpy.typing import NDArray
+
+# 每个 hop 调用一次: (hop 的采样, hop 第一个采样在源时钟上的时间 (秒))
+AudioCallback = Callable[[NDArray[np.float32], float], None]
+
+
+class CallbackStats:
+    """
+    音频回调耗时直方图和 xrun 计数, 截止时间为一个 hop 的时长。
+    只有音频线程写入, 游戏线程随时读取而不加锁: 直方图是预分配的数组,
+    每次回调只做整数自增和赋值, 读到的快照最多落后一个回调。
+    直方图的桶宽为 bin_us, 覆盖到 max_ratio 倍截止时间, 更慢的回调落在最后一个桶。
+    """
+
+    def __init__(
+        self, deadline_ms: float, bin_us: int = 10, max_ratio: int = 4
+    ) -> None:
+        self._deadline_ms = deadline_ms
+        self._deadline_ns = int(deadline_ms * 1e6)
+        self._bin_ns = bin_us * 1000
+        self._histogram = np.zeros(
+            int(deadline_ms * max_ratio * 1000 / bin_us) + 1, dtype=np.int64
+        )
+        self._last_bin = len(self._histogram) - 1
+        self.callbacks = 0
+        # 超过截止时间的回调数
+        self.late = 0
+        self.overflows = 0
+        self.underflows = 0
+        # 回放源落后超过缓冲深度的次数, 不丢数据, 不计入 xruns
+        self.replay_lags = 0
+        self.worst_ms = 0.0
+
+    @property
+    def deadline_ms(self) -> float:
+        return self._deadline_ms
+
+    @property
+    def xruns(self) -> int:
+        return self.overflows + self.underflows
+
+    def record(self, elapsed_ns: int):
+        """音频线程中每个回调调用一次"""
+        self._histogram[min(elapsed_ns // self._bin_ns, self._last_bin)] += 1
+        self.callbacks += 1
+        if elapsed_ns > self._deadline_ns:
+            self.late += 1
+        if elapsed_ns > self.worst_ms * 1e6:
+            self.worst_ms = elapsed_ns / 1e6
+
+    def get_percentile(self, percent: float) -> float:
+        """直方图估计的分位数 (ms, 取桶的上沿, 不超过最坏值)"""
+        histogram = self._histogram.copy()
+        total = int(histogram.sum())
+        if total == 0:
+            return 0.0
+        index = int(np.searchsorted(np.cumsum(histogram), total * percent / 100))
+        return min((index + 1) * self._bin_ns / 1e6, self.worst_ms)
+
+    def reset(self):
+        self._histogram[:] = 0
+        self.callbacks = self.late = self.overflows = self.underflows = 0
+        self.replay_lags = 0
+        self.worst_ms = 0.0
+
+    def format(self) -> str:
+        return (
+            f"audio callback p99 {self.get_percentile(99):.2f} ms, "
+            f"max {self.worst_ms:.2f} ms (deadline {self._deadline_ms:.2f} ms), "
+            f"late {self.late}/{self.callbacks}, "
+            f"overflow {self.overflows}, underflow {self.underflows}"
+            + (f", replay lag {self.replay_lags}" if self.replay_lags else "")
+        )
+
+
+class IAudioSource(Protocol):
+    @property
+    def sample_rate(self) -> int:
+        raise NotImplementedError
+
+    @property
+    def hop_size(self) -> int:
+        raise NotImplementedError
+
+    @property
+    def channels(self) -> int:
+        """大于 1 时回调收到 (hop_size, channels) 的交错数据"""
+        return 1
+
+    def start(self, callback: AudioCallback):
+        raise NotImplementedError
+
+    def stop(self):
+        raise NotImplementedError
+
+    def get_time_ms(self) -> float:
+        """源时钟上的当前时间, 与回调收到的时间是同一时钟"""
+        raise NotImplementedError
+
+    @property
+    def callback_stats(self) -> CallbackStats:
+        raise NotImplementedError
+
+
+class PyAudioSource(IAudioSource):
+    def __init__(
+        self,
+        sample_rate: int = 44100,
+        hop_size: int = 256,
+        device_index: Optional[int] = 0,
+        channels: int = 1,
+    ) -> None:
+        self._sample_rate = sample_rate
+        self._hop_size = hop_size
+        self._device_index = device_index
+        self._channels = channels
+        self._pyaudio = None
+        self._stream = None
+        self._callback: Optional[AudioCallback] = None
+        self._callback_stats = CallbackStats(hop_size / sample_rate * 1000)
+
+    @property
+    def sample_rate(self) -> int:
+        return self._sample_rate
+
+    @property
+    def hop_size(self) -> int:
+        return self._hop_size
+
+    @property
+    def channels(self) -> int:
+        return self._channels
+
+    @property
+    def callback_stats(self) -> CallbackStats:
+        return self._callback_stats
+
+    def start(self, callback: AudioCallback):
+        import pyaudio
+
+        self._callback = callback
+        self._continue_flag = pyaudio.paContinue
+        self._overflow_flag = pyaudio.paInputOverflow
+        self._underflow_flag = pyaudio.paInputUnderflow
+        self._pyaudio = pyaudio.PyAudio()
+        self._stream = self._pyaudio.open(
+            format=pyaudio.paFloat32,
+            channels=self._channels,
+            rate=self._sample_rate,
+            input=True,
+            input_device_index=self._device_index,
+            frames_per_buffer=self._hop_size,
+            stream_callback=self._process_audio_callback,
+        )
+        self._stream.start_stream()
+
+    def _process_audio_callback(
+        self, in_data: Optional[bytes], frame_count: int, time_info, status
+    ):
+        start_ns = time.perf_counter_ns()
+        # 溢出: 上一个回调太慢, PortAudio 丢掉了输入; 欠载: 输入数据不足, 补了静音
+        if status & self._overflow_flag:
+            self._callback_stats.overflows += 1
+        if status & self._underflow_flag:
+            self._callback_stats.underflows += 1
+        if in_data is not None and self._callback is not None:
+            # 部分 host API 不提供 adc 时间 (为 0), 此时退回到回调时刻
+            adc_time = time_info["input_buffer_adc_time"] or time_info["current_time"]
+            samples = np.frombuffer(in_data, dtype=np.float32)
+            if self._channels > 1:
+                samples = samples.reshape(-1, self._channels)
+            self._callback(samples, adc_time)
+        self._callback_stats.record(time.perf_counter_ns() - start_ns)
+        return in_data, self._continue_flag
+
+    def stop(self):
+        if self._stream is None:
+            return
+        self._stream.stop_stream()
+        self._stream.close()
+        self._pyaudio.terminate()
+        self._stream = None
+        self._pyaudio = None
+
+    def get_time_ms(self) -> float:
+        """PortAudio stream time; 未启动时为 0"""
+        if self._stream is None:
+            return 0.0
+        return self._stream.get_time() * 1000
+
+
+class GeneratorSource(IAudioSource):
+    """
+    把生成器产生的任意长度的数据块切成 hop 回放。
+    多声道时每块为 (采样数, channels) 的数组。
+    源时钟从 0 开始: 尽快运行和 process_until 时为已回放的采样数, 实时运行时为墙上时间。
+    回放不会丢数据, 实时运行时落后超过 lag_hops 个 hop (相当于声卡的缓冲深度)
+    只在 CallbackStats.replay_lags 中按次计数 (追上之前只计一次), 不算作 xrun。
+    """
+
+    def __init__(
+        self,
+        blocks: Iterable[NDArray],
+        sample_rate: int = 44100,
+        hop_size: int = 256,
+        realtime: bool = False,
+        channels: int = 1,
+        lag_hops: int = 4,
+    ) -> None:
+        self._hops = self._iter_hops(blocks, hop_size, channels)
+        self._channels = channels
+        self._sample_rate = sample_rate
+        self._hop_size = hop_size
+        self._realtime = realtime
+        self._processed_samples = 0
+        self._finished = False
+        self._callback: Optional[AudioCallback] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+        self._start_time = 0.0
+        self._callback_stats = CallbackStats(hop_size / sample_rate * 1000)
+        self._lag_samples = lag_hops * hop_size
+
+    @property
+    def sample_rate(self) -> int:
+        return self._sample_rate
+
+    @property
+    def hop_size(self) -> int:
+        return self._hop_size
+
+    @property
+    def channels(self) -> int:
+        return self._channels
+
+    @property
+    def callback_stats(self) -> CallbackStats:
+        return self._callback_stats
+
+    @property
+    def finished(self) -> bool:
+        return self._finished
+
+    @staticmethod
+    def _iter_hops(
+        blocks: Iterable[NDArray], hop_size: int, channels: int
+    ) -> Iterator[NDArray[np.float32]]:
+        """不足一个 hop 的部分留到下一块; 最后一个不完整的 hop 补零"""
+        frame_shape = () if channels == 1 else (channels,)
+        carry = np.zeros((0,) + frame_shape, dtype=np.float32)
+        for block in blocks:
+            data = np.concatenate((carry, np.asarray(block, dtype=np.float32)))
+            end = len(data) // hop_size * hop_size
+            for start in range(0, end, hop_size):
+                yield data[start : start + hop_size]
+            carry = data[end:]
+        if len(carry):
+            padding = np.zeros((hop_size - len(carry),) + frame_shape, np.float32)
+            yield np.concatenate((carry, padding))
+
+    def _process_next_hop(self) -> bool:
+        hop = next(self._hops, None)
+        if hop is None:
+            self._finished = True
+            return False
+        time_s = self._processed_samples / self._sample_rate
+        self._processed_samples += self._hop_size
+        if self._callback is not None:
+            start_ns = time.perf_counter_ns()
+            self._callback(hop, time_s)
+            self._callback_stats.record(time.perf_counter_ns() - start_ns)
+        return True
+
+    def process_until(self, time_ms: float, callback: Optional[AudioCallback] = None):
+        """同步回放到源时钟的 time_ms 为止, 不启动线程"""
+        if callback is not None:
+            self._callback = callback
+        end_sample = time_ms * self._sample_rate / 1000
+        while self._processed_samples + self._hop_size <= end_sample:
+            if not self._process_next_hop():
+                return
+
+    def start(self, callback: AudioCallback):
+        self._callback = callback
+        self._stop_event.clear()
+        self._start_time = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        lagging = False
+        while not self._stop_event.is_set():
+            if self._realtime:
+                # hop 结束的时刻到了才交付, 与声卡的节奏一致
+                due = (self._processed_samples + self._hop_size) / self._sample_rate
+                delay = self._start_time + due - time.perf_counter()
+                if delay > 0:
+                    lagging = False
+                    self._stop_event.wait(delay)
+                    continue
+                if not lagging and -delay * self._sample_rate > self._lag_samples:
+                    lagging = True
+                    self._callback_stats.replay_lags += 1
+            if not self._process_next_hop():
+                return
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def wait(self, timeout: Optional[float] = None):
+        """等待回放线程处理完全部数据"""
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def get_time_ms(self) -> float:
+        if self._realtime and self._thread is not None:
+            return (time.perf_counter() - self._start_time) * 1000
+        return self._processed_samples * 1000 / self._sample_rate
+
+
+class ArraySource(GeneratorSource):
+    def __init__(
+        self,
+        samples: NDArray,
+        sample_rate: int = 44100,
+        hop_size: int = 256,
+        realtime: bool = False,
+    ) -> None:
+        """samples 为单声道的一维数组或 (采样数, channels) 的多声道数组"""
+        samples = np.asarray(samples, dtype=np.float32)
+        if samples.ndim not in (1, 2):
+            raise ValueError("samples must be 1-D or (frames, channels)")
+        if samples.ndim == 2 and samples.shape[1] == 1:
+            samples = samples[:, 0]
+        channels = 1 if samples.ndim == 1 else samples.shape[1]
+        super().__init__((samples,), sample_rate, hop_size, realtime, channels)
+
+
+class WavFileSource(GeneratorSource):
+    """采样率取自文件, 多声道混为单声道"""
+
+    def __init__(
+        self,
+        path: str,
+        hop_size: int = 256,
+        realtime: bool = False,
+        block_size: int = 1 << 16,
+    ) -> None:
+        with wave.open(path, "rb") as wav:
+            sample_rate = wav.getframerate()
+        super().__init__(
+            self._iter_wav_blocks(path, block_size), sample_rate, hop_size, realtime
+        )
+
+    @staticmethod
+    def _iter_wav_blocks(path: str, block_size: int) -> Iterator[NDArray[np.float32]]:
+        with wave.open(path, "rb") as wav:
+            channels = wav.getnchannels()
+            sample_width = wav.getsampwidth()
+            while True:
+                frames = wav.readframes(block_size)
+                if not frames:
+                    return
+                yield pcm_to_float32(frames, sample_width, channels)
+
+
+def pcm_to_float32(frames: bytes, sample_width: int, channels: int) -> NDArray:
+    match sample_width:
+        case 1:
+            samples = (np.frombuffer(frames, dtype=np.uint8) - 128.0) / 128
+        case 2:
+            samples = np.frombuffer(frames, dtype="<i2") / 32768.0
+        case 4:
+            samples = np.frombuffer(frames, dtype="<i4") / 2147483648.0
+        case _:
+            raise ValueError(f"unsupported sample width: {sample_width}")
+    samples = samples.astype(np.float32)
+    if channels > 1:
+        samples = samples.reshape(-1, channels).mean(axis=1, dtype=np.float32)
+    return samples
@@ -1,16 +1,20 @@
 from __future__ import annotations
 from typing import (
     Dict,
+    Iterable,
     List,
     Mapping,
     Optional,
     Protocol,
+    Sequence,
     Tuple,
     Type,
     runtime_checkable,
 )
 
+import numpy as np
 import pygame
+from numpy.typing import NDArray
 
 
 @runtime_checkable
@@ -21,27 +25,52 @@ class Updateable(Protocol):
 
 class ICamera(Updateable, Protocol):
     def world_rect_to_screen(self, world_rect: pygame.Rect) -> pygame.Rect:
-        return pygame.Rect(
-            world_rect.x - self.get_position().x,
-            world_rect.y - self.get_position().y,
-            world_rect.width,
-            world_rect.height,
-        )
+        position = self.get_position()
+        return world_rect.move(-position.x, -position.y)
 
     def world_to_screen(self, world_position: pygame.Vector2) -> pygame.Vector2:
-        return pygame.Vector2(
-            world_position.x - self.get_position().x,
-            world_position.y - self.get_position().y,
-        )
+        return world_position - self.get_position()
 
     def get_horizon_rect_in_world(self) -> pygame.Rect:
-        x = self.get_position().x
-        y = self.get_position().y
-        return pygame.Rect(x, y, self.get_horizon_size().x, self.get_horizon_size().y)
+        position = self.get_position()
+        size = self.get_horizon_size()
+        return pygame.Rect(position.x, position.y, size.x, size.y)
 
     def is_rect_visiable(self, rect: pygame.Rect) -> bool:
         return rect.colliderect(self.get_horizon_rect_in_world())
 
+    def world_positions_to_screen(
+        self, positions: NDArray[np.float64]
+    ) -> NDArray[np.float64]:
+        """批量变换 (N, 2) 的世界坐标"""
+        position = self.get_position()
+        return positions - (position.x, position.y)
+
+    def cull_bounds(self, bounds: NDArray[np.float64]) -> NDArray[np.bool_]:
+        """
+        (N, 4) 的 (left, top, right, bottom) 中与视野相交的掩码,
+        与 pygame.Rect.colliderect 的规则一致
+        """
+        view = self.get_horizon_rect_in_world()
+        return (
+            (bounds[:, 0] < view.right)
+            & (view.left < bounds[:, 2])
+            & (bounds[:, 1] < view.bottom)
+            & (view.top < bounds[:, 3])
+        )
+
+    def get_render_alpha(self) -> float:
+        """渲染时在上一步和当前模拟状态之间插值的系数, 0 为上一步, 1 为当前"""
+        return 1.0
+
+    def set_render_alpha(self, alpha: float):
+        raise NotImplementedError
+
+    def interpolate(
+        self, previous: pygame.Vector2, current: pygame.Vector2
+    ) -> pygame.Vector2:
+        return previous.lerp(current, self.get_render_alpha())
+
     def get_horizon_size(self) -> pygame.Vector2:
         raise NotImplementedError
 
@@ -80,8 +109,17 @@ class WorldDrawable(Protocol):
 @runtime_checkable
 class IActor(Updateable, Protocol):
     def update(self, delta_time_ms: int):
+        """
+        先更新自己的组件, 再调用 update_self。
+        Game 中组件由 ComponentRegistry 按类型统一更新, Game 只调用 update_self
+        """
         for component in self._get_component_dict().values():
             component.update(delta_time_ms)
+        self.update_self(delta_time_ms)
+
+    def update_self(self, delta_time_ms: int):
+        """actor 自身的逻辑, 不包括组件"""
+        pass
 
     def get_position(self) -> pygame.Vector2:
         return pygame.Vector2(0, 0)
@@ -98,9 +136,19 @@ class IActor(Updateable, Protocol):
         raise NotImplementedError
 
     def draw(self, surface: pygame.Surface, camera: ICamera):
+        """先绘制自己的组件, 再调用 draw_self; Game 中组件由 ComponentRegistry 统一绘制"""
         for component in self._get_component_dict().values():
             if isinstance(component, WorldDrawable):
                 component.draw(surface, camera)
+        self.draw_self(surface, camera)
+
+    def draw_self(self, surface: pygame.Surface, camera: ICamera):
+        """绘制 actor 自身, 不包括组件"""
+        pass
+
+    def on_destroy(self):
+        """从游戏中移除时调用, 用于释放资源"""
+        pass
 
 
 @runtime_checkable
@@ -109,11 +157,45 @@ class CollisionableActor(IActor, Protocol):
         raise NotImplementedError
 
 
+class IBroadphase(Protocol):
+    def find_pairs(self, rects: Sequence[pygame.Rect]) -> Iterable[Tuple[int, int]]:
+        """返回可能相交的矩形下标对 (i < j), 由调用方做精确检测"""
+        raise NotImplementedError
+
+
 @runtime_checkable
 class EventHandleAble(Protocol):
     def handle_event(self, event: IEvent):
         raise NotImplementedError
 
+    def get_handled_event_types(self) -> Iterable[IEventType]:
+        """订阅的事件类型, 只会收到这些类型的事件"""
+        raise NotImplementedError
+
+
+@runtime_checkable
+class IPoolable(Protocol):
+    def reset(self, **kwargs):
+        """从对象池中取出复用时调用, 参数与构造函数相同"""
+        raise NotImplementedError
+
+
+@runtime_checkable
+class ICullable(Protocol):
+    """离开视野后不绘制, 离开保留区域后被回收的 actor"""
+
+    def get_world_rect(self) -> pygame.Rect:
+        raise NotImplementedError
+
+
+@runtime_checkable
+class IBatchCullable(Protocol):
+    """自行存储大量精灵的 actor, 由剔除系统一次性回收保留区域外的精灵"""
+
+    def despawn_outside(self, keep_rect: pygame.Rect) -> int:
+        """回收与 keep_rect 不相交的精灵, 返回回收的数量"""
+        raise NotImplementedError
+
 
 class IPawn(IActor, Protocol):
     def get_position(self) -> pygame.Vector2:
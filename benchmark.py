@@ -0,0 +1,925 @@
+"""
+性能基准测试, 不需要声卡和显示器:
+
+    python benchmark.py                  # 运行全部
+    python benchmark.py offline_analysis # 只运行指定项目
+    python benchmark.py startup --startup-budget-ms 1000  # 冷启动预算检查
+"""
+
+import argparse
+import functools
+import itertools
+import os
+import subprocess
+import sys
+import time
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+import numpy as np
+from numpy.typing import NDArray
+
+
+def synthesize_guitar_signal(
+    seconds: float, sample_rate: int = 44100, interval_s: float = 0.25, seed: int = 0
+) -> NDArray[np.float32]:
+    """每隔 interval_s 拨一次弦的合成信号 (衰减正弦 + 少量噪声)"""
+    rng = np.random.default_rng(seed)
+    samples = (rng.standard_normal(int(seconds * sample_rate)) * 1e-3).astype(
+        np.float32
+    )
+    t = np.arange(int(interval_s * sample_rate)) / sample_rate
+    envelope = np.exp(-t * 8) * 0.5
+    for i, start in enumerate(
+        range(0, len(samples) - len(t), int(interval_s * sample_rate))
+    ):
+        frequency = 82.41 * 2 ** ((i * 5 % 24) / 12)
+        samples[start : start + len(t)] += np.sin(2 * np.pi * frequency * t) * envelope
+    return samples
+
+
+def bench_offline_analysis():
+    from guitar_input import OfflineGuitarAnalyzer
+
+    seconds = 120
+    analyzer = OfflineGuitarAnalyzer()
+    samples = synthesize_guitar_signal(seconds, analyzer.sample_rate)
+    hop_count = len(samples) // analyzer.hop_size
+
+    start = time.perf_counter()
+    hits = analyzer.analyze(samples)
+    elapsed = time.perf_counter() - start
+
+    realtime_factor = seconds / elapsed
+    print(
+        f"offline_analysis: {seconds}s audio, {len(hits)} hits, "
+        f"{hop_count / elapsed:,.0f} hops/s, {realtime_factor:.0f}x realtime "
+        f"({'OK' if realtime_factor >= 100 else 'BELOW'} target 100x)"
+    )
+
+
+class _BenchCollisionActor:
+    """与 BounsActor 相同的碰撞矩形计算, 避免加载图片和声音"""
+
+    def __init__(self, x: float, y: float) -> None:
+        import pygame
+
+        self._position = pygame.Vector2(x, y)
+        self._sprite_size = (50, 50)
+
+    def get_collision_rect(self):
+        import pygame
+
+        rect = pygame.Rect(self._position.x, self._position.y, *self._sprite_size)
+        collision_size = 4
+        return pygame.Rect(
+            rect.centerx - collision_size // 2,
+            rect.bottom - collision_size,
+            collision_size,
+            collision_size,
+        )
+
+
+def _naive_collision_pairs(actors, limit=None) -> Iterable[Tuple[int, int]]:
+    """优化前的做法: 所有组合, 每对调用两次 get_collision_rect"""
+    pairs = []
+    combinations = itertools.combinations(range(len(actors)), 2)
+    for i, j in itertools.islice(combinations, limit):
+        if actors[i].get_collision_rect().colliderect(actors[j].get_collision_rect()):
+            pairs.append((i, j))
+    return pairs
+
+
+def _broadphase_collision_pairs(actors, broadphase) -> Iterable[Tuple[int, int]]:
+    rects = [actor.get_collision_rect() for actor in actors]
+    return [
+        (i, j)
+        for i, j in broadphase.find_pairs(rects)
+        if rects[i].colliderect(rects[j])
+    ]
+
+
+def bench_collision():
+    from collision import SortAndSweepBroadphase, UniformGridBroadphase
+
+    rng = np.random.default_rng(0)
+    naive_pair_limit = 2_000_000
+    print("collision (ms per frame):")
+    print(f"{'actors':>8} {'naive':>12} {'sweep':>10} {'grid':>10} {'pairs':>8}")
+    for count in (10, 100, 1_000, 10_000):
+        # 每拍生成的金币沿水平方向排开, 分布在几条高度上
+        actors = [
+            _BenchCollisionActor(x, y)
+            for x, y in zip(
+                rng.uniform(0, count * 20, count), rng.choice([-100, -50, 0], count)
+            )
+        ]
+        total_pairs = count * (count - 1) // 2
+        start = time.perf_counter()
+        naive = _naive_collision_pairs(actors, naive_pair_limit)
+        naive_ms = (time.perf_counter() - start) * 1000
+        naive_label = f"{naive_ms:.3f}"
+        if total_pairs > naive_pair_limit:
+            naive_ms *= total_pairs / naive_pair_limit
+            naive_label = f"~{naive_ms:.0f}(est)"
+
+        results = {}
+        for name, broadphase in (
+            ("sweep", SortAndSweepBroadphase()),
+            ("grid", UniformGridBroadphase()),
+        ):
+            start = time.perf_counter()
+            pairs = _broadphase_collision_pairs(actors, broadphase)
+            results[name] = ((time.perf_counter() - start) * 1000, pairs)
+        if total_pairs <= naive_pair_limit:
+            assert sorted(results["sweep"][1]) == sorted(naive)
+            assert sorted(results["grid"][1]) == sorted(naive)
+        print(
+            f"{count:>8} {naive_label:>12} {results['sweep'][0]:>10.3f} "
+            f"{results['grid'][0]:>10.3f} {len(results['sweep'][1]):>8}"
+        )
+
+
+def bench_event_dispatch():
+    import pygame
+    from base import EventHandleAble, IEvent
+    from event import EVENT_TYPE, ActorCollisionEvent, EventBus, KEY_TYPE, KeyDownEvent
+
+    class BenchCoin(EventHandleAble):
+        def __init__(self) -> None:
+            self.handled = 0
+
+        def get_handled_event_types(self):
+            return (EVENT_TYPE.ACTOR_COLLISION,)
+
+        def handle_event(self, event: IEvent):
+            # 广播时 actor 需要自己过滤, 与原来的 BounsActor.handle_event 相同
+            match event.get_type():
+                case EVENT_TYPE.ACTOR_COLLISION:
+                    if self not in event.get_actors():  # type: ignore
+                        return
+                    self.handled += 1
+
+    class BenchPlayer(BenchCoin):
+        def get_handled_event_types(self):
+            return (EVENT_TYPE.KEY_DOWN, EVENT_TYPE.ACTOR_COLLISION)
+
+    def broadcast(actors, events):
+        for event in events:
+            for actor in actors:
+                if isinstance(actor, EventHandleAble):
+                    actor.handle_event(event)
+
+    def publish(event_bus, events):
+        for event in events:
+            event_bus.publish(event)
+
+    print("event_dispatch (ms per frame, 1 key + 10 collision events):")
+    print(f"{'actors':>8} {'broadcast':>10} {'bus':>10}")
+    for count in (10, 100, 1_000, 10_000):
+        player = BenchPlayer()
+        actors = [player] + [BenchCoin() for _ in range(count - 1)]
+        event_bus = EventBus()
+        for actor in actors:
+            event_bus.subscribe(actor, actor.get_handled_event_types())
+        events = [KeyDownEvent(KEY_TYPE.SPACE)] + [
+            ActorCollisionEvent(player, actor, pygame.Rect(0, 0, 1, 1))  # type: ignore
+            for actor in actors[1:11]
+        ]
+
+        timings = []
+        for dispatch, target in ((broadcast, actors), (publish, event_bus)):
+            repeat = max(1, 10_000 // count)
+            start = time.perf_counter()
+            for _ in range(repeat):
+                dispatch(target, events)
+            timings.append((time.perf_counter() - start) * 1000 / repeat)
+        print(f"{count:>8} {timings[0]:>10.3f} {timings[1]:>10.3f}")
+
+    return _check_system_event_drain()
+
+
+def _check_system_event_drain() -> bool:
+    """大量不转换的系统事件之后, SDL 队列应被取空, 之后的 QUIT 仍能送达"""
+    import pygame
+    from event import EVENT_TYPE, EventManager
+
+    _init_headless_pygame()
+    pygame.event.clear()
+    for _ in range(3):
+        for _ in range(60_000):
+            pygame.event.post(pygame.event.Event(pygame.MOUSEMOTION))
+        EventManager.get_unhandled_events()
+    remaining = len(pygame.event.get(pump=False))
+    pygame.event.post(pygame.event.Event(pygame.QUIT))
+    events = EventManager.get_unhandled_events()
+    quit_delivered = any(event.get_type() == EVENT_TYPE.QUIT for event in events)
+    drained = remaining == 0 and quit_delivered
+    print(
+        f"system events left in SDL queue: {remaining}, "
+        f"QUIT delivered: {quit_delivered} {'ok' if drained else 'FAILED'}"
+    )
+    return drained
+
+
+def _init_headless_pygame():
+    import os
+    import pygame
+
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+    pygame.init()
+    return pygame.display.set_mode((640, 480))
+
+
+def _make_bench_camera():
+    import pygame
+    from base import ICamera
+
+    class BenchCamera(ICamera):
+        def __init__(self) -> None:
+            self._position = pygame.Vector2(0, -200)
+            self._horizon_size = pygame.Vector2(640, 480)
+
+        def get_position(self):
+            return self._position
+
+        def get_horizon_size(self) -> pygame.Vector2:
+            return self._horizon_size
+
+    return BenchCamera()
+
+
+def bench_sprite_batch():
+    import pygame
+    from actor import BounsActor, BounsBatchActor
+    from sprite_batch import SpriteBatch
+
+    screen = _init_headless_pygame()
+    camera = _make_bench_camera()
+    rng = np.random.default_rng(0)
+    frames = 20
+    print("sprite_batch (ms per frame, update + cull, then including blits):")
+    print(
+        f"{'coins':>8} {'actors':>12} {'batch':>12} "
+        f"{'actors+blit':>12} {'batch+blit':>12}"
+    )
+    for count in (100, 1_000, 5_000):
+        # 一半在屏幕内, 一半在屏幕外
+        positions = np.stack(
+            (rng.uniform(-640, 1280, count), rng.uniform(-200, 200, count)), axis=1
+        )
+        actors = [BounsActor(pygame.Vector2(*p)) for p in positions.tolist()]
+        batch = BounsBatchActor()
+        for position in positions.tolist():
+            batch.spawn_bouns(pygame.Vector2(*position))
+
+        def per_actor_frame(blit: bool):
+            for actor in actors:
+                actor.update(16)
+            for actor in actors:
+                position = actor.get_position()
+                if camera.is_rect_visiable(
+                    actor._sprite.get_rect().move(position.x, position.y)
+                ):
+                    if blit:
+                        screen.blit(actor._sprite, camera.world_to_screen(position))
+
+        def batch_frame(blit: bool):
+            batch.update(16)
+            if blit:
+                SpriteBatch.draw(batch, screen, camera)
+            else:
+                batch.get_visible_mask(camera)
+
+        timings = []
+        for blit in (False, True):
+            for frame in (per_actor_frame, batch_frame):
+                start = time.perf_counter()
+                for _ in range(frames):
+                    frame(blit)
+                timings.append((time.perf_counter() - start) * 1000 / frames)
+        print(
+            f"{count:>8} {timings[0]:>12.3f} {timings[1]:>12.3f} "
+            f"{timings[2]:>12.3f} {timings[3]:>12.3f}"
+        )
+
+
+def bench_camera():
+    import pygame
+    from game import Camera
+
+    screen = _init_headless_pygame()
+    cameras = {
+        "protocol": _make_bench_camera(),
+        "cached": Camera(pygame.Vector2(640, 480), pygame.Vector2(0, -200)),
+    }
+    sprite = pygame.Surface((16, 16))
+    rng = np.random.default_rng(0)
+    frames = 20
+    print("camera (ms per frame, cull + transform + blit, about a fifth on screen):")
+    print(f"{'sprites':>8} {'per-actor':>12} {'cached':>12} {'batch':>12}")
+    for count in (1_000, 5_000, 20_000):
+        positions = np.stack(
+            (rng.uniform(-640, 1280, count), rng.uniform(-400, 400, count)), axis=1
+        )
+        vectors = [pygame.Vector2(*p) for p in positions.tolist()]
+        bounds = np.concatenate((positions, positions + sprite.get_size()), axis=1)
+
+        def per_actor_frame(camera):
+            for position in vectors:
+                if camera.is_rect_visiable(
+                    sprite.get_rect().move(position.x, position.y)
+                ):
+                    screen.blit(sprite, camera.world_to_screen(position))
+
+        def batch_frame(camera):
+            visible = camera.cull_bounds(bounds)
+            screen_positions = camera.world_positions_to_screen(positions[visible])
+            screen.blits(
+                [(sprite, p) for p in screen_positions.tolist()], doreturn=False
+            )
+
+        timings = []
+        for frame, camera in (
+            (per_actor_frame, cameras["protocol"]),
+            (per_actor_frame, cameras["cached"]),
+            (batch_frame, cameras["cached"]),
+        ):
+            start = time.perf_counter()
+            for _ in range(frames):
+                frame(camera)
+            timings.append((time.perf_counter() - start) * 1000 / frames)
+        print(f"{count:>8} {timings[0]:>12.3f} {timings[1]:>12.3f} {timings[2]:>12.3f}")
+
+
+def bench_components():
+    import pygame
+    from base import IActor, IComponent, WorldDrawable
+    from components import ComponentRegistry
+
+    screen = _init_headless_pygame()
+    camera = _make_bench_camera()
+
+    class Actor(IActor):
+        def __init__(self) -> None:
+            self._component_dict = {}
+
+        def _get_component_dict(self):
+            return self._component_dict
+
+    def make_component_type(name: str, drawable: bool):
+        def __init__(self, owner):
+            self._owner = owner
+            self.ticks = 0
+
+        def update(self, delta_time_ms):
+            self.ticks += 1
+
+        def draw(self, surface, camera):
+            pass
+
+        members = {"__init__": __init__, "update": update}
+        if drawable:
+            members["draw"] = draw
+        return type(name, (IComponent,), members)
+
+    component_types = [
+        make_component_type(f"Component{i}", drawable=i % 2 == 0) for i in range(4)
+    ]
+    frames = 20
+    print("components (ms per frame, update + draw dispatch, 4 components per actor):")
+    print(f"{'actors':>8} {'per-actor':>12} {'registry':>12}")
+    for count in (100, 1_000, 5_000):
+        actors = []
+        registry = ComponentRegistry()
+        for _ in range(count):
+            actor = Actor()
+            for component_type in component_types:
+                actor.add_component(component_type(actor))
+            registry.add_actor(actor)
+            actors.append(actor)
+
+        def per_actor_frame():
+            # 改动之前 IActor.update / IActor.draw 的做法
+            for actor in actors:
+                for component in actor._get_component_dict().values():
+                    component.update(16)
+            for actor in actors:
+                for component in actor._get_component_dict().values():
+                    if isinstance(component, WorldDrawable):
+                        component.draw(screen, camera)
+
+        def registry_frame():
+            registry.update(16)
+            registry.draw(screen, camera)
+
+        timings = []
+        for frame in (per_actor_frame, registry_frame):
+            start = time.perf_counter()
+            for _ in range(frames):
+                frame()
+            timings.append((time.perf_counter() - start) * 1000 / frames)
+        print(f"{count:>8} {timings[0]:>12.3f} {timings[1]:>12.3f}")
+
+
+def bench_capabilities():
+    import pygame
+    from actor import BounsActor, MetronomeActor
+    from actor_store import ActorStore
+    from base import CollisionableActor
+    from capabilities import CAPABILITY, get_capabilities
+
+    _init_headless_pygame()
+    frames = 20
+    # 240Hz 模拟、60fps 显示时每帧 4 个模拟步, 每步筛选一次可碰撞 actor
+    steps_per_frame = 4
+    print("capabilities (ms per frame, selecting collisionable actors per step):")
+    print(f"{'actors':>8} {'isinstance':>12} {'flags':>12} {'store':>12}")
+    for count in (100, 1_000, 5_000):
+        actors = [
+            MetronomeActor() if i % 10 == 0 else BounsActor(pygame.Vector2(i, 0))
+            for i in range(count)
+        ]
+        store = ActorStore()
+        for actor in actors:
+            if CAPABILITY.COLLISIONABLE in get_capabilities(type(actor)):
+                store.add(actor)
+
+        def isinstance_frame():
+            for _ in range(steps_per_frame):
+                [actor for actor in actors if isinstance(actor, CollisionableActor)]
+
+        def flags_frame():
+            for _ in range(steps_per_frame):
+                [
+                    actor
+                    for actor in actors
+                    if CAPABILITY.COLLISIONABLE in get_capabilities(type(actor))
+                ]
+
+        def store_frame():
+            for _ in range(steps_per_frame):
+                list(store)
+
+        timings = []
+        for frame in (isinstance_frame, flags_frame, store_frame):
+            start = time.perf_counter()
+            for _ in range(frames):
+                frame()
+            timings.append((time.perf_counter() - start) * 1000 / frames)
+        print(f"{count:>8} {timings[0]:>12.3f} {timings[1]:>12.3f} {timings[2]:>12.3f}")
+
+
+def bench_frame_time():
+    import pygame
+    from actor import BounsActor
+    from game import Game
+    from headless import HeadlessRunner, ScriptedInput, summarize
+
+    duration_ms = 2000
+    rng = np.random.default_rng(0)
+    print(
+        f"frame_time (ms per frame over {duration_ms / 1000:.0f}s simulated, p50/p95/p99):"
+    )
+    print(f"{'actors':>8} {'bpm':>5} {'update':>22} {'collision':>22} {'paint':>22}")
+    for count in (10, 100, 1_000):
+        for bpm in (120, 240, 480):
+            game = Game(audio_io=False, bpm=bpm)
+            script = ScriptedInput()
+            script.add_guitar_hits(np.arange(0, duration_ms, 60_000 / bpm))
+            runner = HeadlessRunner(game, script)
+
+            def prepare(game):
+                for x, y in zip(
+                    rng.uniform(0, 640, count), rng.uniform(-200, 200, count)
+                ):
+                    game.add_actor(BounsActor(pygame.Vector2(x, y)))
+
+            runner.setup(prepare)
+            timings = runner.run(duration_ms)
+            runner.teardown()
+            columns = [
+                "/".join(f"{value:.2f}" for value in summarize(timings[phase]))
+                for phase in ("update", "collision", "paint")
+            ]
+            print(
+                f"{count:>8} {bpm:>5} {columns[0]:>22} {columns[1]:>22} {columns[2]:>22}"
+            )
+
+
+# Game 默认的渲染方式每帧 p50 最多比另一种慢这一比例 (计时抖动), 否则 render 基准失败
+RENDER_DEFAULT_TOLERANCE = 0.1
+
+
+def bench_render() -> bool:
+    """Game 默认的渲染方式不能比另一种慢; p95 在单核机器上抖动太大, 比较 p50"""
+    import inspect
+
+    import pygame
+    from actor import BounsActor
+    from game import Game
+    from headless import HeadlessRunner, ScriptedInput, summarize
+
+    duration_ms = 1000
+    rng = np.random.default_rng(0)
+    default_dirty_rects = inspect.signature(Game).parameters["dirty_rects"].default
+    # dummy 视频驱动下 flip 几乎没有开销, 真实显示上整屏提交的代价不在这里体现
+    print("render (ms per frame, paint + present, p50/p95/p99):")
+    print(f"{'actors':>8} {'full redraw':>22} {'dirty rects':>22}")
+    default_is_faster = True
+    for count in (10, 100, 1_000):
+        columns = []
+        p50s = {}
+        for dirty_rects in (False, True):
+            game = Game(audio_io=False, dirty_rects=dirty_rects)
+            runner = HeadlessRunner(game, ScriptedInput())
+            positions = np.stack(
+                (rng.uniform(0, 640, count), rng.uniform(-200, 200, count)), axis=1
+            ).tolist()
+
+            def prepare(game):
+                for position in positions:
+                    game.add_actor(BounsActor(pygame.Vector2(*position)))
+
+            runner.setup(prepare)
+            timings = runner.run(duration_ms)
+            runner.teardown()
+            percentiles = summarize(timings["paint"] + timings["present"])
+            p50s[dirty_rects] = percentiles[0]
+            columns.append("/".join(f"{value:.2f}" for value in percentiles))
+        print(f"{count:>8} {columns[0]:>22} {columns[1]:>22}")
+        other_p50 = p50s[not default_dirty_rects]
+        if p50s[default_dirty_rects] > other_p50 * (1 + RENDER_DEFAULT_TOLERANCE):
+            default_is_faster = False
+    default_name = "dirty rects" if default_dirty_rects else "full redraw"
+    print(
+        f"default renderer ({default_name}) not slower: "
+        f"{'ok' if default_is_faster else 'FAILED'}"
+    )
+    return default_is_faster
+
+
+def bench_replay():
+    import pygame
+    from actor import PlayerActor
+    from audio_source import ArraySource
+    from game import Game
+    from guitar_input import GuitarInput
+    from headless import HeadlessRunner, ScriptedInput, summarize
+
+    seconds = 10
+    signal = synthesize_guitar_signal(seconds)
+    print(f"replay: detection pipeline on {seconds}s of audio, as fast as possible")
+    print(f"{'hop':>6} {'latency ms':>11} {'x realtime':>11} {'us per hop':>11}")
+    for hop_size in (128, 256, 512, 1024):
+        source = ArraySource(signal, hop_size=hop_size)
+        guitar_input = GuitarInput(source)
+        start = time.perf_counter()
+        guitar_input.process_until(seconds * 1000)
+        elapsed = time.perf_counter() - start
+        hops = len(signal) // hop_size
+        print(
+            f"{hop_size:>6} {hop_size / source.sample_rate * 1000:>11.1f} "
+            f"{seconds / elapsed:>11.0f} {elapsed / hops * 1e6:>11.1f}"
+        )
+
+    print("replay: full game, audio stepped with the virtual clock (p50/p95/p99 ms)")
+    final_positions = []
+    for _ in range(2):
+        game = Game(audio_io=False, audio_source=ArraySource(signal), sync_audio=True)
+        runner = HeadlessRunner(game, ScriptedInput())
+        runner.setup()
+        timings = runner.run(seconds * 1000)
+        [player] = [a for a in game._actor_store if isinstance(a, PlayerActor)]
+        final_positions.append(pygame.Vector2(player.get_position()))
+        runner.teardown()
+    for phase in ("event", "update", "paint"):
+        values = "/".join(f"{value:.2f}" for value in summarize(timings[phase]))
+        print(f"{phase:>10} {values:>22}")
+    print(f"deterministic: {final_positions[0] == final_positions[1]}")
+
+
+def bench_channels():
+    import os
+    from audio_source import ArraySource
+    from multichannel_input import MultiChannelGuitarInput
+
+    seconds = 1
+    hop_size = 256
+    deadline_ms = hop_size / 44100 * 1000
+    cpus = os.cpu_count() or 1
+    print(
+        f"channels ({seconds}s realtime replay, callback p99 ms / dropped hops; "
+        f"hop deadline {deadline_ms:.1f} ms, {cpus} CPUs):"
+    )
+    print(f"{'channels':>9} {'inline':>16} {'processes':>16}")
+    signals = np.stack(
+        [synthesize_guitar_signal(seconds, seed=i) for i in range(64)], axis=1
+    )
+    max_channels = {"inline": 0, "processes": 0}
+    for channels in (1, 2, 4, 8, 16, 32, 64):
+        columns = []
+        for mode, workers in (("inline", 0), ("processes", None)):
+            guitar_input = MultiChannelGuitarInput(
+                ArraySource(signals[:, :channels], hop_size=hop_size, realtime=True),
+                workers=workers,
+            )
+            guitar_input.on_setup()
+            guitar_input.source.wait()
+            guitar_input.on_destory()
+            stats = guitar_input.source.callback_stats
+            p99 = stats.get_percentile(99)
+            # 进程池的回调不等待结果, 跟不上时表现为 dropped_hops 而不是回调超时
+            if p99 < deadline_ms and not stats.xruns and not guitar_input.dropped_hops:
+                max_channels[mode] = channels
+            columns.append(f"{p99:.3f}/{guitar_input.dropped_hops}")
+        print(f"{channels:>9} {columns[0]:>16} {columns[1]:>16}")
+    print(
+        f"channels within deadline: inline {max_channels['inline']}, "
+        f"processes {max_channels['processes']}"
+    )
+
+
+# 启用和弦分析后音频回调的 p99 最多增加 hop 时长的这一比例, 留出余量给 onset / pitch 检测
+CHORD_HOP_BUDGET_FRACTION = 0.25
+# 标准调弦的常见开放和弦指法 (MIDI 音高)
+BENCH_CHORDS = {
+    "C": (48, 52, 55, 60, 64),
+    "Am": (45, 52, 57, 60, 64),
+    "G": (43, 47, 50, 55, 59, 67),
+    "E5": (40, 47, 52),
+    "D7": (50, 57, 60, 66),
+    "Em": (40, 47, 52, 55, 59, 64),
+    "A": (45, 52, 57, 61, 64),
+    "Dm": (50, 57, 62, 65),
+}
+
+
+def synthesize_chord_signal(
+    pitches: Iterable[int],
+    seconds: float,
+    sample_rate: int = 44100,
+    seed: int = 0,
+) -> NDArray[np.float32]:
+    """扫弦: 每根弦为带谐波的衰减正弦加上拨片的噪声瞬态, 各弦间隔 10ms 依次拨响"""
+    rng = np.random.default_rng(seed)
+    samples = (rng.standard_normal(int(seconds * sample_rate)) * 1e-3).astype(
+        np.float32
+    )
+    for string, pitch in enumerate(pitches):
+        start = int(string * 0.01 * sample_rate)
+        t = np.arange(len(samples) - start) / sample_rate
+        frequency = 440 * 2 ** ((pitch - 69) / 12)
+        for harmonic in range(1, 7):
+            amplitude = rng.uniform(0.5, 1) * 0.6 ** (harmonic - 1) * 0.05
+            phase = rng.uniform(0, 2 * np.pi)
+            samples[start:] += (
+                amplitude
+                * np.sin(2 * np.pi * frequency * harmonic * t + phase)
+                * np.exp(-t * 3)
+            )
+    # 拨片击弦的宽带噪声, 真实扫弦的 onset 主要来自这里
+    pick = np.arange(int(0.005 * sample_rate))
+    samples[pick] += rng.standard_normal(len(pick)) * 0.1 * np.exp(-pick / 50)
+    return samples
+
+
+def bench_chords() -> bool:
+    """
+    预算按实时回放中音频回调自己的计时 (CallbackStats) 判断:
+    chords=True 与 chords=False 的回调 p99 之差不超过预算, 且没有超时的回调
+    """
+    from audio_source import ArraySource
+    from chord import CHORD_LABELS, ChordAnalyzer, mask_to_pitches
+    from guitar_input import GuitarInput
+
+    hop_size = 256
+    deadline_ms = hop_size / 44100 * 1000
+    budget_ms = deadline_ms * CHORD_HOP_BUDGET_FRACTION
+    names = list(BENCH_CHORDS)
+    signal = np.concatenate(
+        [
+            synthesize_chord_signal(BENCH_CHORDS[name], 1.0, seed=i)
+            for i, name in enumerate(names)
+        ]
+    )
+    # 回调中只有 process (移入窗口), analyze 在游戏循环中每次扫弦执行一次
+    print("chords: ChordAnalyzer cost (process per hop, analyze per strum)")
+    print(
+        f"{'fft_size':>9} {'process p99':>12} {'analyze p50':>12} {'analyze p99':>12}"
+    )
+    for fft_size in (2048, 4096, 8192, 16384):
+        analyzer = ChordAnalyzer(fft_size=fft_size)
+        hop_times = []
+        analyze_times = []
+        for start in range(0, len(signal) - hop_size, hop_size):
+            hop = signal[start : start + hop_size]
+            begin = time.perf_counter()
+            analyzer.process(hop)
+            hop_times.append((time.perf_counter() - begin) * 1000)
+            if start // hop_size % 16 == 0:
+                begin = time.perf_counter()
+                analyzer.analyze(analyzer.window.copy())
+                analyze_times.append((time.perf_counter() - begin) * 1000)
+        analyze_p50, analyze_p99 = np.percentile(analyze_times[1:], (50, 99))
+        print(
+            f"{fft_size:>9} {np.percentile(hop_times[10:], 99):>12.3f} "
+            f"{analyze_p50:>12.3f} {analyze_p99:>12.3f}"
+        )
+
+    print("chords: GuitarInput(chords=True) on strummed chords")
+    guitar_input = GuitarInput(ArraySource(signal, hop_size=hop_size), chords=True)
+    guitar_input.process_until(len(signal) / 44100 * 1000)
+    # 每次扫弦取最近的第一个 hit; 漏检或标错都算失败, 多余的 onset 只打印
+    labels: Dict[int, str] = {}
+    for hit in guitar_input.drain_hits():
+        # onset 的 get_last 可能略早于和弦开始
+        strum = round(hit["time_ms"] / 1000)
+        label = CHORD_LABELS[hit["chord"]] if hit["chord"] >= 0 else "-"
+        labels.setdefault(strum, label)
+        pitches = mask_to_pitches(int(hit["pitches"]))
+        print(
+            f"{hit['time_ms']:>9.1f} ms  expected {names[strum]:<3} got {label:<4} "
+            f"pitches {pitches}"
+        )
+    correct = sum(labels.get(i) == name for i, name in enumerate(names))
+    print(f"chords correct: {correct}/{len(names)}")
+
+    seconds = 3
+    realtime_signal = signal[: seconds * 44100]
+    print(
+        f"chords: {seconds}s realtime replay, audio callback "
+        f"(hop {deadline_ms:.1f} ms, budget +{budget_ms:.2f} ms p99)"
+    )
+    print(f"{'config':>12} {'p99 ms':>8} {'max ms':>8} {'late':>6} {'xruns':>6}")
+    p99s = {}
+    within_budget = True
+    for chords in (False, True):
+        source = ArraySource(realtime_signal, hop_size=hop_size, realtime=True)
+        guitar_input = GuitarInput(source, chords=chords)
+        guitar_input.on_setup()
+        source.wait(seconds * 4)
+        guitar_input.on_destory()
+        guitar_input.drain_hits()
+        stats = source.callback_stats
+        p99s[chords] = stats.get_percentile(99)
+        print(
+            f"{'chords' if chords else 'onset+pitch':>12} {p99s[chords]:>8.3f} "
+            f"{stats.worst_ms:>8.3f} {stats.late:>6} {stats.xruns:>6}"
+        )
+        if chords and (stats.late or stats.xruns):
+            within_budget = False
+    if p99s[True] - p99s[False] > budget_ms:
+        within_budget = False
+    print(f"chord stage within budget: {'ok' if within_budget else 'FAILED'}")
+    return within_budget and correct == len(names)
+
+
+def bench_callbacks():
+    from audio_source import ArraySource
+    from guitar_input import GuitarInput
+
+    seconds = 2
+    signal = synthesize_guitar_signal(seconds)
+    print(f"callbacks: {seconds}s realtime replay, audio callback vs hop deadline")
+    print(
+        f"{'config':>16} {'p99 ms':>8} {'max ms':>8} {'late':>6} "
+        f"{'xruns':>6} {'lags':>5} {'deadline':>9}"
+    )
+    for name, chords, extra_ms in (
+        ("onset+pitch", False, 0.0),
+        ("chords", True, 0.0),
+        ("slow callback", False, 8.0),
+    ):
+        source = ArraySource(signal, realtime=True)
+        guitar_input = GuitarInput(source, chords=chords)
+
+        def process_hop(samples, adc_time):
+            guitar_input._process_hop(samples, adc_time)
+            # 模拟回调中耗时的游戏逻辑
+            if extra_ms:
+                time.sleep(extra_ms / 1000)
+
+        source.start(process_hop)
+        source.wait(seconds * 4)
+        source.stop()
+        stats = source.callback_stats
+        print(
+            f"{name:>16} {stats.get_percentile(99):>8.3f} {stats.worst_ms:>8.3f} "
+            f"{stats.late:>6} {stats.xruns:>6} {stats.replay_lags:>5} "
+            f"{stats.deadline_ms:>9.2f}"
+        )
+
+
+# 冷启动到第一帧的预算, 超出时 startup 基准以非零状态退出
+STARTUP_BUDGET_MS = 1500
+# 游戏启动时不应该被导入的模块 (输入后端按需加载)
+STARTUP_FORBIDDEN_MODULES = ("aubio", "pyaudio", "matplotlib", "django", "tomlkit")
+FIRST_FRAME_SCRIPT = """
+from game import Game
+game = Game(audio_io=False)
+game._setup()
+game.run_frame(0)
+"""
+
+
+def _parse_importtime(stderr: str) -> Dict[str, Tuple[int, int, int]]:
+    """-X importtime 的输出: 模块名 -> (self us, cumulative us, 嵌套深度)"""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        modules[name.strip()] = (int(self_us), int(cumulative_us), depth)
+    return modules
+
+
+def bench_startup(budget_ms: float = STARTUP_BUDGET_MS) -> bool:
+    env = dict(
+        os.environ,
+        SDL_VIDEODRIVER="dummy",
+        SDL_AUDIODRIVER="dummy",
+        PYGAME_HIDE_SUPPORT_PROMPT="1",
+    )
+    cwd = os.path.dirname(os.path.abspath(__file__))
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import game"],
+        env=env,
+        cwd=cwd,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    modules = _parse_importtime(result.stderr)
+    print("startup (import game, -X importtime, top-level imports by cumulative ms):")
+    top_level = sorted(
+        (
+            (cumulative, name)
+            for name, (_, cumulative, depth) in modules.items()
+            if depth <= 1
+        ),
+        reverse=True,
+    )
+    for cumulative, name in top_level[:8]:
+        print(f"{name:>24} {cumulative / 1000:>10.1f}")
+    forbidden = [
+        name for name in modules if name.split(".")[0] in STARTUP_FORBIDDEN_MODULES
+    ]
+    if forbidden:
+        print(f"unexpected imports: {', '.join(sorted(forbidden))}")
+
+    timings = []
+    for _ in range(3):
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, "-c", FIRST_FRAME_SCRIPT], env=env, cwd=cwd, check=True
+        )
+        timings.append((time.perf_counter() - start) * 1000)
+    first_frame_ms = float(np.median(timings))
+    within_budget = first_frame_ms <= budget_ms and not forbidden
+    print(
+        f"cold start to first frame: {first_frame_ms:.0f} ms "
+        f"(budget {budget_ms:.0f} ms) {'ok' if within_budget else 'FAILED'}"
+    )
+    return within_budget
+
+
+BENCHMARKS: Dict[str, Callable[[], Optional[bool]]] = {
+    "offline_analysis": bench_offline_analysis,
+    "collision": bench_collision,
+    "event_dispatch": bench_event_dispatch,
+    "sprite_batch": bench_sprite_batch,
+    "camera": bench_camera,
+    "components": bench_components,
+    "capabilities": bench_capabilities,
+    "frame_time": bench_frame_time,
+    "replay": bench_replay,
+    "channels": bench_channels,
+    "chords": bench_chords,
+    "callbacks": bench_callbacks,
+    "startup": bench_startup,
+    "render": bench_render,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("names", nargs="*", help=", ".join(BENCHMARKS))
+    parser.add_argument("--startup-budget-ms", type=float, default=STARTUP_BUDGET_MS)
+    args = parser.parse_args()
+    for name in args.names:
+        if name not in BENCHMARKS:
+            parser.error(f"unknown benchmark: {name}")
+    benchmarks = dict(
+        BENCHMARKS,
+        startup=functools.partial(bench_startup, args.startup_budget_ms),
+    )
+    # 返回 False 的基准 (如超出预算) 使退出状态非零
+    failed = [name for name in args.names or benchmarks if benchmarks[name]() is False]
+    if failed:
+        sys.exit(f"failed: {', '.join(failed)}")
+
+
+if __name__ == "__main__":
+    main()
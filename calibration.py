@@ -0,0 +1,169 @@
+"""
+输入/输出延迟校准:
+
+    python calibration.py              # 播放节拍器, 跟着拍子拨弦 (或把输出回环到输入)
+    python calibration.py --synthetic  # 用人工延迟的信号离线验证估计算法
+
+校准结果保存在 calibration.json, hit 时间减去该延迟即为实际拨弦时间。
+"""
+
+import argparse
+import json
+import os
+from typing import Sequence
+
+import numpy as np
+from numpy.typing import NDArray
+
+CALIBRATION_PATH = "calibration.json"
+
+
+def estimate_latency_ms(
+    click_times_ms: Sequence[float],
+    onset_times_ms: Sequence[float],
+    min_latency_ms: float = -20,
+    max_latency_ms: float = 500,
+    min_pairs: int = 4,
+) -> float:
+    """
+    把每个 onset 与它之前最近的一次点击配对, 取延迟的中位数,
+    再剔除偏离中位数超过 3 倍 MAD 的样本 (漏拨、多拨) 后重新取中位数。
+    onset 检测会补偿检测延迟, 时间可能略早于点击, 因此允许少量负延迟。
+    """
+    clicks = np.sort(np.asarray(click_times_ms, dtype=np.float64))
+    onsets = np.asarray(onset_times_ms, dtype=np.float64)
+    click_indexes = np.searchsorted(clicks, onsets - min_latency_ms, side="right") - 1
+    valid = click_indexes >= 0
+    latencies = onsets[valid] - clicks[click_indexes[valid]]
+    latencies = latencies[latencies <= max_latency_ms]
+    if len(latencies) < min_pairs:
+        raise ValueError(f"not enough onsets to calibrate: {len(latencies)}")
+
+    median = np.median(latencies)
+    mad = np.median(np.abs(latencies - median))
+    inliers = latencies[np.abs(latencies - median) <= 3 * mad + 1e-9]
+    return float(np.median(inliers))
+
+
+def estimate_latency_xcorr_ms(
+    reference: NDArray,
+    recorded: NDArray,
+    sample_rate: int,
+    max_latency_ms: float = 500,
+) -> float:
+    """回环模式: 对播放的信号和录到的信号做 FFT 互相关, 取峰值位置"""
+    reference = np.asarray(reference, dtype=np.float64)
+    recorded = np.asarray(recorded, dtype=np.float64)
+    size = len(reference) + len(recorded)
+    fft_size = 1 << (size - 1).bit_length()
+    correlation = np.fft.irfft(
+        np.fft.rfft(recorded, fft_size) * np.conj(np.fft.rfft(reference, fft_size)),
+        fft_size,
+    )
+    max_lag = min(int(max_latency_ms * sample_rate / 1000), len(recorded) - 1)
+    lag = int(np.argmax(correlation[: max_lag + 1]))
+    return lag * 1000 / sample_rate
+
+
+def load_latency_ms(path: str = CALIBRATION_PATH) -> float:
+    if not os.path.exists(path):
+        return 0.0
+    with open(path) as f:
+        return float(json.load(f)["latency_ms"])
+
+
+def save_latency_ms(latency_ms: float, path: str = CALIBRATION_PATH):
+    with open(path, "w") as f:
+        json.dump({"latency_ms": latency_ms}, f)
+
+
+def run_calibration(click_count: int = 24, interval_ms: float = 750) -> float:
+    import pygame
+    from guitar_input import GuitarInput
+
+    pygame.mixer.init()
+    click_sound = pygame.mixer.Sound("metronome.wav")
+    clock = pygame.time.Clock()
+    guitar_input = GuitarInput()
+    guitar_input.on_setup()
+
+    started_time = guitar_input.get_time_ms() + 1000
+    click_times = []
+    onset_times = []
+    while True:
+        now = guitar_input.get_time_ms()
+        if len(click_times) < click_count:
+            if now >= started_time + len(click_times) * interval_ms:
+                click_sound.play()
+                click_times.append(now)
+        elif now >= click_times[-1] + interval_ms:
+            break
+        onset_times.extend(guitar_input.drain_hits()["time_ms"])
+        clock.tick(500)
+    guitar_input.on_destory()
+
+    latency_ms = estimate_latency_ms(click_times, onset_times)
+    save_latency_ms(latency_ms)
+    return latency_ms
+
+
+def check_synthetic(delay_ms: float = 87.3, sample_rate: int = 44100):
+    """把 metronome.wav 的点击排成节拍, 人为延迟并加噪声后检查两种估计方法"""
+    from audio_source import pcm_to_float32
+    from guitar_input import OfflineGuitarAnalyzer
+    import wave
+
+    with wave.open("metronome.wav", "rb") as wav:
+        click = pcm_to_float32(
+            wav.readframes(wav.getnframes()), wav.getsampwidth(), wav.getnchannels()
+        )
+
+    interval = int(0.6 * sample_rate)
+    click_positions = np.arange(sample_rate // 2, 20 * sample_rate, interval)
+    reference = np.zeros(21 * sample_rate, dtype=np.float32)
+    for position in click_positions:
+        reference[position : position + len(click)] += click
+
+    delay = round(delay_ms * sample_rate / 1000)
+    rng = np.random.default_rng(0)
+    recorded = np.concatenate((np.zeros(delay, dtype=np.float32), reference))
+    recorded += (rng.standard_normal(len(recorded)) * 1e-3).astype(np.float32)
+
+    analyzer = OfflineGuitarAnalyzer(sample_rate)
+    click_times_ms = click_positions * 1000 / sample_rate
+    expected_ms = delay * 1000 / sample_rate
+    # onset 检测本身的偏差对回环和真实演奏是一样的, 应计入延迟;
+    # 这里用未延迟信号的检测结果扣除它, 只检验估计算法
+    detector_bias_ms = estimate_latency_ms(
+        click_times_ms, analyzer.analyze(reference)["time_ms"]
+    )
+    onset_ms = estimate_latency_ms(
+        click_times_ms, analyzer.analyze(recorded)["time_ms"]
+    )
+    xcorr_ms = estimate_latency_xcorr_ms(reference, recorded, sample_rate)
+
+    hop_ms = analyzer.hop_size * 1000 / sample_rate
+    print(f"expected: {expected_ms:.2f} ms")
+    print(
+        f"onset median: {onset_ms - detector_bias_ms:.2f} ms "
+        f"(detector bias {detector_bias_ms:.2f} ms)"
+    )
+    print(f"cross-correlation: {xcorr_ms:.2f} ms")
+    assert abs(onset_ms - detector_bias_ms - expected_ms) <= hop_ms
+    assert abs(xcorr_ms - expected_ms) <= 1000 / sample_rate
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--synthetic", action="store_true")
+    args = parser.parse_args()
+    if args.synthetic:
+        check_synthetic()
+        return
+    print("跟着节拍器拨弦...")
+    latency_ms = run_calibration()
+    print(f"latency: {latency_ms:.1f} ms, saved to {CALIBRATION_PATH}")
+
+
+if __name__ == "__main__":
+    main()
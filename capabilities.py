@@ -0,0 +1,60 @@
+from enum import IntFlag
+from typing import Dict, Tuple
+
+from base import (
+    CollisionableActor,
+    EventHandleAble,
+    IBatchCullable,
+    ICullable,
+    IEvent,
+    IPoolable,
+    Updateable,
+    WorldDrawable,
+)
+
+
+class CAPABILITY(IntFlag):
+    NONE = 0
+    COLLISIONABLE = 1
+    EVENT_HANDLER = 2
+    POOLABLE = 4
+    CULLABLE = 8
+    BATCH_CULLABLE = 16
+    WORLD_DRAWABLE = 32
+    EVENT = 64
+    # 覆盖了 Updateable.update 的类型
+    UPDATABLE = 128
+
+
+_PROTOCOL_CAPABILITIES: Tuple[Tuple[type, CAPABILITY], ...] = (
+    (CollisionableActor, CAPABILITY.COLLISIONABLE),
+    (EventHandleAble, CAPABILITY.EVENT_HANDLER),
+    (IPoolable, CAPABILITY.POOLABLE),
+    (ICullable, CAPABILITY.CULLABLE),
+    (IBatchCullable, CAPABILITY.BATCH_CULLABLE),
+    (WorldDrawable, CAPABILITY.WORLD_DRAWABLE),
+    (IEvent, CAPABILITY.EVENT),
+)
+
+_capabilities: Dict[type, CAPABILITY] = {}
+
+
+def get_capabilities(cls: type) -> CAPABILITY:
+    """
+    类型实现的 Protocol, 每个类型只用 issubclass 检查一次, 之后查表。
+    runtime_checkable Protocol 的 isinstance 每次都要检查对象的全部属性, 不能放在每帧的路径上。
+    """
+    capabilities = _capabilities.get(cls)
+    if capabilities is None:
+        capabilities = CAPABILITY.NONE
+        for protocol, capability in _PROTOCOL_CAPABILITIES:
+            if issubclass(cls, protocol):
+                capabilities |= capability
+        if getattr(cls, "update", Updateable.update) is not Updateable.update:
+            capabilities |= CAPABILITY.UPDATABLE
+        _capabilities[cls] = capabilities
+    return capabilities
+
+
+def has_capability(obj: object, capability: CAPABILITY) -> bool:
+    return capability in get_capabilities(type(obj))
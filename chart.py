@@ -0,0 +1,150 @@
+from enum import IntEnum
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+from numpy.typing import NDArray
+
+from metronome import BeatGrid
+
+
+class NOTE_STATE(IntEnum):
+    PENDING = 0
+    PERFECT = 1
+    GOOD = 2
+    OK = 3
+    MISS = 4
+
+
+# judge 的返回值: 每个 hit 一条记录, 未命中任何音符时 note_index 为 -1
+JUDGEMENT_DTYPE = np.dtype(
+    [("note_index", np.int64), ("error_ms", np.float64), ("state", np.int8)]
+)
+
+
+class NoteChart:
+    """
+    谱面: 按时间排序的音符时间和音高数组, 以及每个音符的判定状态。
+    judge 对一批 hit 用 np.searchsorted 找到相邻音符, 向量化地完成匹配和评级,
+    每个 hit 的代价为 O(log n), 支持任意细分和复合节奏。
+    pitch 为 -1 的音符不检查音高。
+    """
+
+    def __init__(
+        self,
+        times_ms: Sequence[float],
+        pitches: Optional[Sequence[int]] = None,
+        perfect_ms: float = 5,
+        good_ms: float = 10,
+        allowed_error_ms: float = 30,
+    ) -> None:
+        times_ms = np.asarray(times_ms, dtype=np.float64)
+        order = np.argsort(times_ms, kind="stable")
+        self._times_ms = times_ms[order]
+        if pitches is None:
+            self._pitches = np.full(len(times_ms), -1, dtype=np.int16)
+        else:
+            self._pitches = np.asarray(pitches, dtype=np.int16)[order]
+        self._states = np.zeros(len(times_ms), dtype=np.int8)
+        self._errors_ms = np.full(len(times_ms), np.nan)
+        self._windows_ms = np.array([perfect_ms, good_ms, allowed_error_ms])
+        self._allowed_error_ms = allowed_error_ms
+        self._expired_count = 0
+
+    @classmethod
+    def from_beat_grid(
+        cls,
+        grid: BeatGrid,
+        beat_count: int,
+        subdivisions: Sequence[int] = (1,),
+        **kwargs,
+    ) -> "NoteChart":
+        """
+        每拍按 subdivisions 中的各个细分放置音符并合并去重,
+        例如 (1,) 为四分音符, (2,) 为八分音符, (3, 2) 为三对二复合节奏。
+        """
+        beats = np.unique(
+            np.concatenate(
+                [
+                    np.arange(beat_count * subdivision) / subdivision
+                    for subdivision in subdivisions
+                ]
+            )
+        )
+        times_ms = grid.beat_positions(beats) * 1000 / grid.sample_rate
+        return cls(times_ms, **kwargs)
+
+    def __len__(self) -> int:
+        return len(self._times_ms)
+
+    @property
+    def times_ms(self) -> NDArray[np.float64]:
+        return self._times_ms
+
+    @property
+    def states(self) -> NDArray[np.int8]:
+        return self._states
+
+    @property
+    def errors_ms(self) -> NDArray[np.float64]:
+        return self._errors_ms
+
+    def judge(
+        self, hit_times_ms: NDArray, hit_pitches: Optional[NDArray] = None
+    ) -> NDArray:
+        """
+        把每个 hit 匹配到左右相邻音符中误差较小且尚未判定的一个,
+        同一批中多个 hit 命中同一音符时只有最早的生效。
+        """
+        hit_times_ms = np.asarray(hit_times_ms, dtype=np.float64)
+        result = np.zeros(len(hit_times_ms), dtype=JUDGEMENT_DTYPE)
+        result["note_index"] = -1
+        result["error_ms"] = np.nan
+        if len(hit_times_ms) == 0 or len(self._times_ms) == 0:
+            return result
+
+        right = np.searchsorted(self._times_ms, hit_times_ms)
+        candidates = np.stack(
+            (np.maximum(right - 1, 0), np.minimum(right, len(self._times_ms) - 1))
+        )
+        errors = hit_times_ms - self._times_ms[candidates]
+        distances = np.abs(errors)
+        available = self._states[candidates] == NOTE_STATE.PENDING
+        if hit_pitches is not None:
+            pitches = self._pitches[candidates]
+            available &= (pitches < 0) | (pitches == np.asarray(hit_pitches))
+        distances[~available] = np.inf
+
+        choice = np.argmin(distances, axis=0)
+        columns = np.arange(len(hit_times_ms))
+        note_indexes = candidates[choice, columns]
+        distances = distances[choice, columns]
+        matched = distances < self._allowed_error_ms
+
+        hit_indexes = np.flatnonzero(matched)
+        _, first = np.unique(note_indexes[hit_indexes], return_index=True)
+        hit_indexes = hit_indexes[first]
+        note_indexes = note_indexes[hit_indexes]
+        states = np.searchsorted(self._windows_ms, distances[hit_indexes]) + 1
+
+        self._states[note_indexes] = states
+        self._errors_ms[note_indexes] = errors[choice, columns][hit_indexes]
+        result["note_index"][hit_indexes] = note_indexes
+        result["error_ms"][hit_indexes] = self._errors_ms[note_indexes]
+        result["state"][hit_indexes] = states
+        return result
+
+    def expire(self, now_ms: float) -> NDArray[np.int64]:
+        """把判定窗口已过且仍未命中的音符标记为 MISS, 返回这些音符的下标"""
+        stop = int(np.searchsorted(self._times_ms, now_ms - self._allowed_error_ms))
+        if stop <= self._expired_count:
+            return np.empty(0, dtype=np.int64)
+        indexes = self._expired_count + np.flatnonzero(
+            self._states[self._expired_count : stop] == NOTE_STATE.PENDING
+        )
+        self._states[indexes] = NOTE_STATE.MISS
+        self._expired_count = stop
+        return indexes
+
+    def get_summary(self) -> Tuple[int, ...]:
+        """每种状态的音符数, 按 NOTE_STATE 的顺序"""
+        return tuple(np.bincount(self._states, minlength=len(NOTE_STATE)).tolist())
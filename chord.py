@@ -0,0 +1,193 @@
+"""
+复音 (和弦) 分析: aubio 的音高检测是单音的, 扫弦时只会得到一个随机的音。
+这里对 onset 之后的 fft_size 个采样做加窗实 FFT, 用谐波求和得到每个候选音高的显著度,
+从中选出同时发声的音, 再把显著度折叠成 12 维 chroma 与和弦模板匹配。
+"""
+
+from typing import List, Optional, Tuple
+
+import numpy as np
+from numpy.typing import NDArray
+
+NOTE_NAMES = ("C", "C#", "D", "D#", "E", "F", "F#", "G", "G#", "A", "A#", "B")
+
+# 和弦类型: 后缀和相对根音的半音
+CHORD_QUALITIES = (
+    ("", (0, 4, 7)),
+    ("m", (0, 3, 7)),
+    ("7", (0, 4, 7, 10)),
+    ("m7", (0, 3, 7, 10)),
+    ("5", (0, 7)),
+)
+
+# 按 (类型, 根音) 展开的和弦名, HIT 记录中的 chord 字段为这里的下标, -1 表示没有和弦
+CHORD_LABELS = tuple(
+    NOTE_NAMES[root] + suffix for suffix, _ in CHORD_QUALITIES for root in range(12)
+)
+
+
+def _make_chord_templates() -> NDArray[np.float64]:
+    templates = np.zeros((len(CHORD_LABELS), 12))
+    for quality, (_, intervals) in enumerate(CHORD_QUALITIES):
+        for root in range(12):
+            templates[quality * 12 + root, [(root + i) % 12 for i in intervals]] = 1
+    # 单位化, 与 chroma 的点积即余弦相似度
+    return templates / np.linalg.norm(templates, axis=1, keepdims=True)
+
+
+class ChordAnalyzer:
+    """
+    音频回调每个 hop 调用一次 process, 只把采样移入窗口, 不做 FFT;
+    onset 之后 analysis_delay 个采样时复制 window, 交给消费者 (游戏循环) 调用 analyze,
+    FFT 和迭代的音高估计都不在音频回调线程中执行。
+    analyze 中所有中间数组都预先分配, 只有 rfft 的输出是新分配的。
+
+    默认范围为吉他标准调弦的 E2 (MIDI 40) 到 E6 (MIDI 88)。
+    fft_size 越大低音区分辨率越高, 但窗口越长, 和弦切换时反应越慢。
+    """
+
+    def __init__(
+        self,
+        sample_rate: int = 44100,
+        fft_size: int = 8192,
+        min_pitch: int = 40,
+        max_pitch: int = 88,
+        harmonics: int = 5,
+        max_notes: int = 6,
+        relative_threshold: float = 0.3,
+        fundamental_threshold: float = 0.1,
+        min_chord_score: float = 0.75,
+    ) -> None:
+        self._sample_rate = sample_rate
+        self._fft_size = fft_size
+        self._min_pitch = min_pitch
+        self._max_notes = max_notes
+        self._relative_threshold = relative_threshold
+        self._fundamental_threshold = fundamental_threshold
+        self._min_chord_score = min_chord_score
+        self._history = np.zeros(fft_size, dtype=np.float32)
+        self._window = np.hanning(fft_size).astype(np.float32)
+        self._windowed = np.empty(fft_size, dtype=np.float32)
+        bin_count = fft_size // 2 + 1
+        self._magnitude = np.empty(bin_count)
+        self._residual = np.empty(bin_count)
+
+        pitches = np.arange(min_pitch, max_pitch + 1)
+        frequencies = 440 * 2 ** ((pitches - 69) / 12)
+        harmonic_numbers = np.arange(1, harmonics + 1)
+        bins = np.outer(frequencies, harmonic_numbers) * fft_size / sample_rate
+        # 谐波频率两侧的频点取较大者; 超出奈奎斯特频率的谐波权重为 0
+        lower_bins = np.floor(bins).astype(np.intp)
+        in_range = lower_bins + 1 < bin_count
+        self._lower_bins = np.minimum(lower_bins, bin_count - 2)
+        self._upper_bins = self._lower_bins + 1
+        self._harmonic_weights = np.where(in_range, 0.8 ** (harmonic_numbers - 1), 0.0)
+        self._lower = np.empty(bins.shape)
+        self._upper = np.empty(bins.shape)
+        self._salience = np.zeros(len(pitches))
+        self._pitch_classes = pitches % 12
+        self._chroma = np.zeros(12)
+        self._chord_templates = _make_chord_templates()
+
+    @property
+    def fft_size(self) -> int:
+        return self._fft_size
+
+    @property
+    def analysis_delay(self) -> int:
+        """onset 之后多少个采样再分析: onset 位于窗口中央时前后两个和弦的频谱混在一起"""
+        return self._fft_size * 3 // 4
+
+    @property
+    def window(self) -> NDArray[np.float32]:
+        """最近 fft_size 个采样; 下一次 process 会原地覆盖, 需要保留时调用方复制"""
+        return self._history
+
+    def process(self, samples: NDArray[np.float32]):
+        hop_size = len(samples)
+        history = self._history
+        history[:-hop_size] = history[hop_size:]
+        history[-hop_size:] = samples
+
+    def _compute_spectrum(self, window: NDArray[np.float32]):
+        np.multiply(window, self._window, out=self._windowed)
+        np.abs(np.fft.rfft(self._windowed), out=self._magnitude)
+        self._compute_salience(self._magnitude)
+
+    def _compute_salience(self, magnitude: NDArray[np.float64]):
+        """谐波求和显著度: (音高, 谐波) 的频点幅度按权重求和, 结果写入 _salience"""
+        np.take(magnitude, self._lower_bins, out=self._lower)
+        np.take(magnitude, self._upper_bins, out=self._upper)
+        np.maximum(self._lower, self._upper, out=self._lower)
+        # 基音的频点太弱时不是这个音, 而是它的低八度等被上方音的谐波抬高的候选
+        fundamental = self._lower[:, 0] >= magnitude.max() * self._fundamental_threshold
+        self._lower *= self._harmonic_weights
+        np.sum(self._lower, axis=1, out=self._salience)
+        self._salience *= fundamental
+
+    def get_active_pitches(self) -> List[int]:
+        """
+        迭代估计: 每次取显著度最大的音高, 从残余频谱中去掉它的各次谐波后重新计算,
+        直到显著度低于第一个音的 relative_threshold 倍。作用于最近一次 analyze 的频谱。
+        """
+        residual = self._residual
+        residual[:] = self._magnitude
+        salience = self._salience
+        selected: List[int] = []
+        first_salience = 0.0
+        while len(selected) < self._max_notes:
+            self._compute_salience(residual)
+            index = int(np.argmax(salience))
+            if salience[index] <= first_salience * self._relative_threshold:
+                break
+            first_salience = first_salience or float(salience[index])
+            selected.append(self._min_pitch + index)
+            # 去掉谐波所在频点及 Hann 窗主瓣覆盖的相邻频点
+            for lower_bin in self._lower_bins[index][self._harmonic_weights[index] > 0]:
+                residual[max(lower_bin - 1, 0) : lower_bin + 3] = 0
+        # 恢复这个窗口的显著度, 供 get_chroma 使用
+        self._compute_salience(self._magnitude)
+        return sorted(selected)
+
+    def get_chroma(self, pitches: Optional[List[int]] = None) -> NDArray[np.float64]:
+        """pitches 给出时每个音高计一次, 否则按最近一次 analyze 全部候选音高的显著度统计"""
+        chroma = self._chroma
+        chroma[:] = 0
+        if pitches is None:
+            np.add.at(chroma, self._pitch_classes, self._salience)
+        else:
+            np.add.at(chroma, np.asarray(pitches, dtype=np.intp) % 12, 1)
+        norm = np.linalg.norm(chroma)
+        if norm > 0:
+            chroma /= norm
+        return chroma
+
+    def analyze(
+        self, window: Optional[NDArray[np.float32]] = None
+    ) -> Tuple[List[int], int]:
+        """
+        分析 window (默认为当前的 self.window) 中同时发声的音:
+        (MIDI 音高, CHORD_LABELS 的下标); 少于两个音或不像和弦时下标为 -1
+        """
+        self._compute_spectrum(self._history if window is None else window)
+        pitches = self.get_active_pitches()
+        if len({pitch % 12 for pitch in pitches}) < 2:
+            return pitches, -1
+        scores = self._chord_templates @ self.get_chroma(pitches)
+        chord = int(np.argmax(scores))
+        if scores[chord] < self._min_chord_score:
+            return pitches, -1
+        return pitches, chord
+
+
+def pitches_to_mask(pitches: List[int]) -> int:
+    """MIDI 40-103 的音高集合编码为 64 位掩码, 存入 HIT 记录"""
+    mask = 0
+    for pitch in pitches:
+        if 40 <= pitch < 104:
+            mask |= 1 << (pitch - 40)
+    return mask
+
+
+def mask_to_pitches(mask: int) -> List[int]:
+    return [40 + bit for bit in range(64) if mask >> bit & 1]
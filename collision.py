@@ -0,0 +1,63 @@
+from collections import defaultdict
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+import numpy as np
+import pygame
+
+from base import IBroadphase
+
+
+class SortAndSweepBroadphase(IBroadphase):
+    """
+    按左边界排序后, 每个矩形只和左边界落在自己左右边界之间的矩形配对,
+    再用 y 方向的区间过滤。排序和配对都是向量化的, 代价为 O(n log n + k)。
+    """
+
+    def find_pairs(self, rects: Sequence[pygame.Rect]) -> Iterable[Tuple[int, int]]:
+        count = len(rects)
+        if count < 2:
+            return []
+        bounds = np.array([(r.left, r.right, r.top, r.bottom) for r in rects])
+        order = np.argsort(bounds[:, 0], kind="stable")
+        lefts, rights, tops, bottoms = bounds[order].T
+
+        # 与 pygame.Rect.colliderect 一致, 只接触边界不算相交
+        ends = np.searchsorted(lefts, rights, side="left")
+        counts = np.maximum(ends - np.arange(count) - 1, 0)
+        firsts = np.repeat(np.arange(count), counts)
+        seconds = (
+            firsts
+            + 1
+            + np.arange(counts.sum())
+            - np.repeat(np.cumsum(counts) - counts, counts)
+        )
+        overlap = (tops[firsts] < bottoms[seconds]) & (tops[seconds] < bottoms[firsts])
+        firsts = order[firsts[overlap]]
+        seconds = order[seconds[overlap]]
+        return zip(
+            np.minimum(firsts, seconds).tolist(), np.maximum(firsts, seconds).tolist()
+        )
+
+
+class UniformGridBroadphase(IBroadphase):
+    """把矩形放入覆盖到的所有网格, 只对同一网格内的矩形配对"""
+
+    def __init__(self, cell_size: int = 64) -> None:
+        self._cell_size = cell_size
+
+    def find_pairs(self, rects: Sequence[pygame.Rect]) -> Iterable[Tuple[int, int]]:
+        cell_size = self._cell_size
+        cells: Dict[Tuple[int, int], List[int]] = defaultdict(list)
+        for index, rect in enumerate(rects):
+            for x in range(rect.left // cell_size, (rect.right - 1) // cell_size + 1):
+                for y in range(
+                    rect.top // cell_size, (rect.bottom - 1) // cell_size + 1
+                ):
+                    cells[x, y].append(index)
+
+        pairs = set()
+        for indexes in cells.values():
+            for i, first in enumerate(indexes):
+                for second in indexes[i + 1 :]:
+                    pairs.add((first, second))
+        return pairs
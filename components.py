@@ -0,0 +1,99 @@
+from typing import Dict, Iterable, List, Optional, Tuple, Type
+
+import pygame
+
+from base import IActor, ICamera, IComponent
+from capabilities import CAPABILITY, get_capabilities
+
+
+class ComponentRegistry:
+    """
+    按组件类型集中存放所有 actor 的组件。
+    组件类型第一次注册时判断一次它是否需要更新、是否可绘制,
+    之后的更新和绘制系统只遍历对应类型的组件, 不再对每个组件做 Protocol 检查。
+    使用 registry 的一方 (Game) 只调用 actor 的 update_self / draw_self, 组件由这里分发。
+    """
+
+    def __init__(self) -> None:
+        # 组件类型 -> {owner: component}, dict 保持插入顺序且可 O(1) 删除
+        self._components: Dict[Type[IComponent], Dict[IActor, IComponent]] = {}
+        self._updatable_types: List[Type[IComponent]] = []
+        self._drawable_types: List[Type[IComponent]] = []
+        # 登记过的 actor 自己的组件 dict 和上次对齐时的组件总数,
+        # 总数变化说明有组件绕过 registry 直接用 IActor.add_component 添加
+        self._actor_components: Dict[IActor, Dict[Type[IComponent], IComponent]] = {}
+        self._actor_component_total = 0
+
+    def __len__(self) -> int:
+        return sum(len(components) for components in self._components.values())
+
+    def _register_type(self, component_type: Type[IComponent]):
+        self._components[component_type] = {}
+        capabilities = get_capabilities(component_type)
+        # 没有覆盖 update 的组件不进入更新系统
+        if CAPABILITY.UPDATABLE in capabilities:
+            self._updatable_types.append(component_type)
+        if CAPABILITY.WORLD_DRAWABLE in capabilities:
+            self._drawable_types.append(component_type)
+
+    def add(self, owner: IActor, component: IComponent):
+        component_type = type(component)
+        if component_type not in self._components:
+            self._register_type(component_type)
+        self._components[component_type][owner] = component
+
+    def remove(self, owner: IActor, component_type: Type[IComponent]) -> bool:
+        components = self._components.get(component_type)
+        if components is None:
+            return False
+        return components.pop(owner, None) is not None
+
+    def add_actor(self, actor: IActor):
+        """登记 actor 加入游戏之前已经添加的组件, 之后直接添加的组件在 update 时补登记"""
+        components = actor._get_component_dict()
+        for component in components.values():
+            self.add(actor, component)
+        self._actor_components[actor] = components
+        self._actor_component_total += len(components)
+
+    def remove_actor(self, actor: IActor):
+        components = self._actor_components.pop(actor, {})
+        self._actor_component_total -= len(components)
+        for component_type in components:
+            self.remove(actor, component_type)
+
+    def _add_missing_components(self):
+        total = sum(map(len, self._actor_components.values()))
+        if total == self._actor_component_total:
+            return
+        for actor, components in self._actor_components.items():
+            for component_type, component in components.items():
+                if actor not in self._components.get(component_type, {}):
+                    self.add(actor, component)
+        self._actor_component_total = total
+
+    def get_components(
+        self, component_type: Type[IComponent]
+    ) -> Iterable[Tuple[IActor, IComponent]]:
+        return self._components.get(component_type, {}).items()
+
+    def update(self, delta_time_ms: float):
+        self._add_missing_components()
+        for component_type in self._updatable_types:
+            for component in list(self._components[component_type].values()):
+                component.update(delta_time_ms)
+
+    def draw(
+        self,
+        surface: pygame.Surface,
+        camera: ICamera,
+        visible_actors: Optional[Iterable[IActor]] = None,
+    ):
+        """visible_actors 给出时只绘制属于这些 actor 的组件"""
+        if not self._drawable_types:
+            return
+        visible = None if visible_actors is None else set(visible_actors)
+        for component_type in self._drawable_types:
+            for owner, component in self._components[component_type].items():
+                if visible is None or owner in visible:
+                    component.draw(surface, camera)
@@ -1,12 +1,21 @@
-from enum import Enum
-from telnetlib import IAC
-from typing import TYPE_CHECKING, List, Optional, Protocol, Tuple, Type
-from django.urls import clear_script_prefix
-from matplotlib.pyplot import cla
+from collections import deque
+from enum import Enum, IntEnum
+from typing import (
+    TYPE_CHECKING,
+    Deque,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Protocol,
+    Tuple,
+    Type,
+)
 import pygame
 
 from base import (
     CollisionableActor,
+    EventHandleAble,
     IActor,
     IActorCollisionEvent,
     IActorDestructEvent,
@@ -14,6 +23,7 @@ from base import (
     IEventType,
     IKeyDownEvent,
 )
+from capabilities import CAPABILITY, has_capability
 
 
 class Event(IEvent):
@@ -51,12 +61,19 @@ class ActorDestructEvent(IActorDestructEvent):
 
 
 class ActorCollisionEvent(IActorCollisionEvent):
-    def __init__(self, first: CollisionableActor, second: CollisionableActor) -> None:
+    def __init__(
+        self,
+        first: CollisionableActor,
+        second: CollisionableActor,
+        collision_rect: Optional[pygame.Rect] = None,
+    ) -> None:
         self._first = first
         self._second = second
-        self._collision_rect = self._first.get_collision_rect().clip(
-            self._second.get_collision_rect()
-        )
+        if collision_rect is None:
+            collision_rect = self._first.get_collision_rect().clip(
+                self._second.get_collision_rect()
+            )
+        self._collision_rect = collision_rect
 
     def get_actors(self) -> Tuple[IActor, IActor]:
         return self._first, self._second
@@ -89,6 +106,7 @@ class KEY_TYPE(Enum):
     LEFT = 3
     RIGHT = 4
     SPACE = 5
+    F3 = 6
     OTHER = 100
 
 
@@ -108,14 +126,119 @@ class KeyDownEvent(IKeyDownEvent):
 
 
 class GuitarHitEvent(IEvent):
-    def __init__(self, pitch: int) -> None:
+    def __init__(self, pitch: int, time_ms: float = 0.0) -> None:
         self.pitch = pitch
+        # 音频时钟上的 onset 时间, 见 GuitarInput.get_time_ms
+        self.time_ms = time_ms
 
     def get_type(self) -> IEventType:
         return EVENT_TYPE.GUIATR_HIT
 
 
+class EventBus:
+    """
+    按事件类型分发: 每种事件只发给订阅了该类型的对象, 分发代价与订阅者数量成正比。
+    碰撞事件只发给事件中涉及的两个 actor (前提是它们订阅了碰撞事件)。
+    分发过程中不能订阅或取消订阅, 需要增删 actor 时应投递事件。
+    """
+
+    _TARGETED_EVENT_TYPES = {EVENT_TYPE.ACTOR_COLLISION}
+
+    def __init__(self) -> None:
+        # dict 保持订阅顺序, 且取消订阅为 O(1)
+        self._handlers: Dict[IEventType, Dict[EventHandleAble, None]] = {}
+
+    def subscribe(self, handler: EventHandleAble, event_types: Iterable[IEventType]):
+        for event_type in event_types:
+            self._handlers.setdefault(event_type, {})[handler] = None
+
+    def unsubscribe(self, handler: EventHandleAble):
+        for handlers in self._handlers.values():
+            handlers.pop(handler, None)
+
+    def get_subscriber_count(self, event_type: IEventType) -> int:
+        return len(self._handlers.get(event_type, ()))
+
+    def publish(self, event: IEvent):
+        event_type = event.get_type()
+        handlers = self._handlers.get(event_type)
+        if not handlers:
+            return
+        if event_type in self._TARGETED_EVENT_TYPES:
+            assert isinstance(event, ActorCollisionEvent)
+            for actor in event.get_actors():
+                if actor in handlers:
+                    actor.handle_event(event)  # type: ignore
+            return
+        for handler in handlers:
+            handler.handle_event(event)
+
+
+class EVENT_PRIORITY(IntEnum):
+    HIGH = 0
+    NORMAL = 1
+    LOW = 2
+
+
+class OVERFLOW_POLICY(Enum):
+    # 丢弃新事件
+    DROP_NEWEST = 1
+    # 丢弃优先级不高于新事件的最旧事件, 没有则丢弃新事件
+    DROP_OLDEST = 2
+    RAISE = 3
+
+
+class EventQueueOverflow(Exception):
+    pass
+
+
 class EventManager:
+    """
+    进程内的事件队列: 每个优先级一个 deque, 按优先级从高到低取出, 同优先级先进先出。
+    只有系统输入 (退出、按键) 从 pygame 读取, 内部事件不再经过 SDL 的定长队列。
+    总容量有上限, 满时按 overflow policy 处理。
+    """
+
+    _queues: Tuple[Deque[IEvent], ...] = tuple(deque() for _ in EVENT_PRIORITY)
+    _capacity = 4096
+    _overflow_policy = OVERFLOW_POLICY.DROP_OLDEST
+    _depth = 0
+    _peak_depth = 0
+    _frame_peak_depth = 0
+    _dropped_count = 0
+    _event_priorities = {EVENT_TYPE.QUIT: EVENT_PRIORITY.HIGH}
+
+    @classmethod
+    def configure(
+        cls,
+        capacity: Optional[int] = None,
+        overflow_policy: Optional[OVERFLOW_POLICY] = None,
+    ):
+        if capacity is not None:
+            if capacity <= 0:
+                raise ValueError("capacity must be positive")
+            cls._capacity = capacity
+        if overflow_policy is not None:
+            cls._overflow_policy = overflow_policy
+
+    @classmethod
+    def clear(cls):
+        for queue in cls._queues:
+            queue.clear()
+        cls._depth = 0
+        cls._peak_depth = 0
+        cls._frame_peak_depth = 0
+        cls._dropped_count = 0
+
+    @classmethod
+    def get_frame_peak_depth(cls) -> int:
+        """上一帧 (上次 get_unhandled_events 之前) 队列的最大深度"""
+        return cls._frame_peak_depth
+
+    @classmethod
+    def get_dropped_count(cls) -> int:
+        return cls._dropped_count
+
     @classmethod
     def _convert_keydown_event(cls, event: pygame.event.Event) -> IEvent:
         assert event.type == pygame.KEYDOWN
@@ -130,13 +253,11 @@ class EventManager:
                 return KeyDownEvent(KEY_TYPE.RIGHT)
             case pygame.K_SPACE:
                 return KeyDownEvent(KEY_TYPE.SPACE)
+            case pygame.K_F3:
+                return KeyDownEvent(KEY_TYPE.F3)
             case _:
                 return KeyDownEvent(KEY_TYPE.OTHER)
 
-    @classmethod
-    def _convert_user_event_to_internal(cls, event: pygame.event.Event) -> IEvent:
-        return event.obj
-
     @classmethod
     def _convert_event_to_internal(cls, event: pygame.event.Event) -> Optional[IEvent]:
         match event.type:
@@ -144,18 +265,57 @@ class EventManager:
                 return Event(EVENT_TYPE.QUIT)
             case pygame.KEYDOWN:
                 return cls._convert_keydown_event(event)
-            case pygame.USEREVENT:
-                return cls._convert_user_event_to_internal(event)
             case _:
                 return None
 
+    @classmethod
+    def _pump_system_events(cls):
+        # 取出全部事件, 不转换的类型 (鼠标、TEXTINPUT、窗口事件等) 直接丢弃,
+        # 否则它们留在 SDL 队列中直到队列满, 之后的 QUIT / KEYDOWN 也会被丢掉
+        for event in pygame.event.get():
+            internal_event = cls._convert_event_to_internal(event)
+            if internal_event is not None:
+                cls.post_event(internal_event)
+
     @classmethod
     def get_unhandled_events(cls) -> List[IEvent]:
-        res = pygame.event.get()
-        res = [cls._convert_event_to_internal(event) for event in res]
-        return [event for event in res if event is not None]
+        """每帧调用一次; 处理过程中投递的事件留到下一次"""
+        if pygame.display.get_init():
+            cls._pump_system_events()
+        res = []
+        for queue in cls._queues:
+            res.extend(queue)
+            queue.clear()
+        cls._frame_peak_depth = cls._peak_depth
+        cls._depth = 0
+        cls._peak_depth = 0
+        return res
+
+    @classmethod
+    def post_event(cls, event: IEvent, priority: Optional[EVENT_PRIORITY] = None):
+        assert has_capability(event, CAPABILITY.EVENT)
+        if priority is None:
+            priority = cls._event_priorities.get(
+                event.get_type(), EVENT_PRIORITY.NORMAL  # type: ignore
+            )
+        if cls._depth >= cls._capacity and not cls._make_room(priority):
+            cls._dropped_count += 1
+            return
+        cls._queues[priority].append(event)
+        cls._depth += 1
+        if cls._depth > cls._peak_depth:
+            cls._peak_depth = cls._depth
 
     @classmethod
-    def post_event(cls, event: IEvent):
-        assert isinstance(event, IEvent)
-        pygame.event.post(pygame.event.Event(pygame.USEREVENT, obj=event))
+    def _make_room(cls, priority: EVENT_PRIORITY) -> bool:
+        match cls._overflow_policy:
+            case OVERFLOW_POLICY.RAISE:
+                raise EventQueueOverflow(f"event queue is full ({cls._capacity})")
+            case OVERFLOW_POLICY.DROP_OLDEST:
+                for queue in reversed(cls._queues[priority:]):
+                    if queue:
+                        queue.popleft()
+                        cls._depth -= 1
+                        cls._dropped_count += 1
+                        return True
+        return False
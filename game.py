@@ -0,0 +1,466 @@
+from __future__ import annotations
+import argparse
+import logging
+from typing import (
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Protocol,
+    Tuple,
+    TYPE_CHECKING,
+    Type,
+    runtime_checkable,
+)
+import pygame
+from actor import BounsActor, BounsBatchActor, MetronomeActor, PlayerActor
+from actor_store import ActorPool, ActorStore
+from assets import AssetManager
+from calibration import load_latency_ms
+from capabilities import CAPABILITY, get_capabilities
+from collision import SortAndSweepBroadphase
+from components import ComponentRegistry
+from base import (
+    IActor,
+    IActorCollisionEvent,
+    IBroadphase,
+    ICamera,
+    IComponent,
+    IEvent,
+)
+from event import (
+    EVENT_TYPE,
+    ActorCollisionEvent,
+    ActorCreateEvent,
+    ActorDestructEvent,
+    EventBus,
+    KEY_TYPE,
+    EventManager,
+    GuitarHitEvent,
+    KeyDownEvent,
+)
+from lifetime import CullingSystem
+from metronome import BeatGrid, MetronomeScheduler
+from profiler import FrameProfiler
+from renderer import DirtyRectRenderer
+
+if TYPE_CHECKING:
+    from audio_source import IAudioSource
+    from guitar_input import GuitarInput
+
+
+class Game:
+    # 场景中会出现的 actor 类型, 启动时预加载它们的 ASSETS
+    SCENE_ACTOR_TYPES = (MetronomeActor, PlayerActor, BounsActor)
+
+    def __init__(
+        self,
+        broadphase: Optional[IBroadphase] = None,
+        use_sprite_batch: bool = False,
+        simulation_hz: int = 240,
+        audio_io: bool = True,
+        bpm: int = 120,
+        profile_path: Optional[str] = None,
+        dirty_rects: bool = False,
+        debug_draw: bool = False,
+        audio_source: Optional[IAudioSource] = None,
+        sync_audio: bool = False,
+    ) -> None:
+        self._running = True
+        self._fps = 60
+        # 物理和节奏逻辑以固定步长运行, 与显示帧率无关
+        self._step_ms = 1000 / simulation_hz
+        self._max_catch_up_steps = 8
+        self._accumulator_ms = 0.0
+        self._clock = pygame.time.Clock()
+        self._actor_store = ActorStore()
+        self._actor_pool = ActorPool()
+        self._components = ComponentRegistry()
+        # 按能力分开存放的 actor, 每帧只遍历需要的那一组
+        self._collisionable_actors = ActorStore()
+        self._screen: Optional[pygame.Surface] = None
+        self._camera: Optional[Camera] = None
+        self._guitar_input: Optional[GuitarInput] = None
+        self._input_latency_ms = 0.0
+        self._metronome: Optional[MetronomeScheduler] = None
+        self._event_bus = EventBus()
+        self._dropped_event_count = 0
+        self._audio_xrun_count = 0
+        self._preloaded_assets: List[str] = []
+        # 为 True 时金币存放在 BounsBatchActor 的数组中, 向量化更新
+        self._use_sprite_batch = use_sprite_batch
+        self._bouns_batch: Optional[BounsBatchActor] = None
+        # 为 False 时不打开声卡: 没有吉他输入, 节拍器按模拟时间运行 (无头模式)
+        self._audio_io = audio_io
+        # 给出时吉他输入来自这个音频源 (可以是回放源), 不需要声卡
+        self._audio_source = audio_source
+        # 为 True 时不启动回放线程, 每帧按累计的帧时间同步推进回放源, 结果可复现
+        self._sync_audio = sync_audio
+        self._elapsed_ms = 0.0
+        self._bpm = bpm
+        self._broadphase: IBroadphase = (
+            SortAndSweepBroadphase() if broadphase is None else broadphase
+        )
+        # 给出 profile_path 时从启动起就计时, 退出时导出; 否则按 F3 开关
+        self._profile_path = profile_path
+        self._profiler = FrameProfiler(enabled=profile_path is not None)
+        # 为 True 时只重绘和提交变化的区域, 否则每帧整屏 fill + flip。
+        # 默认关闭: 离屏缓冲多一次整屏复制, benchmark.py render 中比整屏重绘慢
+        self._use_dirty_rects = dirty_rects
+        self._renderer: Optional[DirtyRectRenderer] = None
+        # 为 True 时画出碰撞盒
+        self._debug_draw = debug_draw
+        self._culling = CullingSystem()
+        # 本帧剔除后需要绘制的 actor
+        self._draw_list: List[IActor] = []
+
+    @property
+    def screen(self):
+        if self._screen is None:
+            raise ValueError
+        return self._screen
+
+    @property
+    def camera(self):
+        if self._camera is None:
+            raise ValueError
+        return self._camera
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    @property
+    def profiler(self) -> FrameProfiler:
+        return self._profiler
+
+    def _handle_one_event(self, event: IEvent):
+        logging.debug("%s", event)
+        match event.get_type():
+            case EVENT_TYPE.QUIT:
+                self._running = False
+            case EVENT_TYPE.KEY_DOWN if (
+                isinstance(event, KeyDownEvent) and event.get_key_type() == KEY_TYPE.F3
+            ):
+                self._profiler.toggle()
+            case EVENT_TYPE.ACTOR_DESTRUCT:
+                assert isinstance(event, ActorDestructEvent)
+                logging.debug("removing actor %s", event.get_actor())
+                self.remove_actor(event.get_actor())
+            case EVENT_TYPE.ACTOR_CREATE:
+                assert isinstance(event, ActorCreateEvent)
+                self.add_actor(
+                    self._actor_pool.acquire(
+                        event.get_actor_type(), **event.get_kwargs()
+                    )
+                )
+            case _:
+                self._event_bus.publish(event)
+
+    def _handle_event(self):
+        events = EventManager.get_unhandled_events()
+        logging.debug("event queue peak depth %d", EventManager.get_frame_peak_depth())
+        if EventManager.get_dropped_count() > self._dropped_event_count:
+            self._dropped_event_count = EventManager.get_dropped_count()
+            logging.warning(f"{self._dropped_event_count} events dropped in total")
+        if self._profiler.enabled:
+            for event in events:
+                start = self._profiler.begin()
+                self._handle_one_event(event)
+                self._profiler.end(f"event/{event.get_type().name}", start)
+        else:
+            for event in events:
+                self._handle_one_event(event)
+        self._actor_pool.flush()
+        if self._guitar_input is not None:
+            if self._sync_audio:
+                self._guitar_input.process_until(self._elapsed_ms)
+            callback_stats = self._guitar_input.source.callback_stats
+            if callback_stats.xruns > self._audio_xrun_count:
+                self._audio_xrun_count = callback_stats.xruns
+                logging.warning(callback_stats.format())
+            for hit in self._guitar_input.drain_hits():
+                self._handle_one_event(
+                    GuitarHitEvent(
+                        int(hit["pitch"]),
+                        float(hit["time_ms"]) - self._input_latency_ms,
+                    )
+                )
+
+    def _update_status(self, delta_time_ms: float):
+        self._components.update(delta_time_ms)
+        if self._profiler.enabled:
+            for actor in self._actor_store:
+                start = self._profiler.begin()
+                actor.update_self(delta_time_ms)
+                self._profiler.end(f"actor/{type(actor).__name__}", start)
+            return
+        for actor in self._actor_store:
+            actor.update_self(delta_time_ms)
+
+    def advance(self, frame_time_ms: float) -> int:
+        """
+        把经过的真实时间累加起来, 以固定步长推进模拟, 返回本次执行的步数。
+        落后太多时最多追赶 max_catch_up_steps 步, 其余时间丢弃,
+        剩余不足一步的时间用于渲染插值。
+        """
+        self._accumulator_ms += frame_time_ms
+        steps = 0
+        while self._accumulator_ms >= self._step_ms:
+            if steps >= self._max_catch_up_steps:
+                self._accumulator_ms = self._accumulator_ms % self._step_ms
+                break
+            start = self._profiler.begin()
+            self._update_status(self._step_ms)
+            self._profiler.end("phase/update", start)
+            start = self._profiler.begin()
+            self._process_collision()
+            self._profiler.end("phase/collision", start)
+            self._accumulator_ms -= self._step_ms
+            steps += 1
+        return steps
+
+    def get_render_alpha(self) -> float:
+        return self._accumulator_ms / self._step_ms
+
+    def add_actor(self, actor: IActor):
+        self._actor_store.add(actor)
+        self._components.add_actor(actor)
+        capabilities = get_capabilities(type(actor))
+        if CAPABILITY.COLLISIONABLE in capabilities:
+            self._collisionable_actors.add(actor)
+        if CAPABILITY.EVENT_HANDLER in capabilities:
+            self._event_bus.subscribe(actor, actor.get_handled_event_types())
+
+    def remove_actor(self, actor: IActor):
+        if not self._actor_store.remove(actor):
+            return
+        self._components.remove_actor(actor)
+        capabilities = get_capabilities(type(actor))
+        if CAPABILITY.COLLISIONABLE in capabilities:
+            self._collisionable_actors.remove(actor)
+        if CAPABILITY.EVENT_HANDLER in capabilities:
+            self._event_bus.unsubscribe(actor)
+        if not self._actor_pool.release(actor):
+            actor.on_destroy()
+
+    def add_component(self, actor: IActor, component: IComponent):
+        """给已经在游戏中的 actor 添加组件"""
+        actor.add_component(component)
+        if actor in self._actor_store:
+            self._components.add(actor, component)
+
+    def get_actor(self, actor_type: Type[IActor]):
+        return actor_type
+
+    def _setup(self):
+        pygame.init()
+        self._screen = pygame.display.set_mode((640, 480))
+        pygame.display.set_caption("Metronome")
+        self._screen.fill(pygame.color.Color("white"))
+        if self._use_dirty_rects:
+            self._renderer = DirtyRectRenderer(self._screen)
+
+        self._camera = Camera(
+            pygame.Vector2(self._screen.get_size()), pygame.Vector2(0, -200)
+        )
+        self._preloaded_assets = AssetManager.preload(
+            path for actor_type in self.SCENE_ACTOR_TYPES for path in actor_type.ASSETS
+        )
+        if self._audio_io or self._audio_source is not None:
+            # 输入后端 (PortAudio, aubio) 只在需要吉他输入时加载
+            from guitar_input import GuitarInput
+
+            self._guitar_input = GuitarInput(self._audio_source)
+            self._profiler.add_overlay_source(
+                self._guitar_input.source.callback_stats.format
+            )
+            if not self._sync_audio:
+                self._guitar_input.on_setup()
+        if self._audio_io:
+            if self._audio_source is None:
+                self._input_latency_ms = load_latency_ms()
+            self._metronome = MetronomeScheduler(BeatGrid(self._bpm))
+            self._metronome.start()
+
+        if self._use_sprite_batch:
+            self._bouns_batch = BounsBatchActor()
+            self.add_actor(self._bouns_batch)
+        metronome_actor = MetronomeActor(
+            self._bpm, scheduler=self._metronome, bouns_batch=self._bouns_batch
+        )
+        player_actor = PlayerActor()
+        bouns_actor = BounsActor(pygame.Vector2(200, -100))
+
+        self.add_actor(metronome_actor)
+        self.add_actor(player_actor)
+        self.add_actor(bouns_actor)
+
+    def _paint(self):
+        if self._renderer is None:
+            surface = self.screen
+            surface.fill(pygame.color.Color("white"))
+        else:
+            surface = self._renderer.begin_frame()
+        camera = self.camera
+        self._components.draw(surface, camera, self._draw_list)
+        for actor in self._draw_list:
+            actor.draw_self(surface, camera)
+        if self._debug_draw:
+            self._paint_debug_rects()
+        self._profiler.draw_overlay(surface)
+
+    def _cull(self):
+        self._draw_list, culled = self._culling.run(self._actor_store, self.camera)
+        if culled:
+            logging.debug("culling %d actors", len(culled))
+        for actor in culled:
+            self.remove_actor(actor)
+
+    def _paint_debug_rects(self):
+        camera = self.camera
+        rects = [
+            camera.world_rect_to_screen(actor.get_collision_rect())
+            for actor in self._collisionable_actors
+        ]
+        if self._renderer is not None:
+            self._renderer.draw_debug_rects(rects)
+            return
+        color = pygame.color.Color("red")
+        for rect in rects:
+            pygame.draw.rect(self.screen, color, rect, 1)
+
+    def _present(self):
+        if self._renderer is None:
+            pygame.display.flip()
+        else:
+            self._renderer.present()
+
+    def _process_collision(self):
+        collisionable_actors = list(self._collisionable_actors)
+        rects = [actor.get_collision_rect() for actor in collisionable_actors]
+        for i, j in self._broadphase.find_pairs(rects):
+            if rects[i].colliderect(rects[j]):
+                actor_a = collisionable_actors[i]
+                actor_b = collisionable_actors[j]
+                logging.debug("collision %s %s", actor_a, actor_b)
+                EventManager.post_event(
+                    ActorCollisionEvent(actor_a, actor_b, rects[i].clip(rects[j]))
+                )
+        if self._bouns_batch is not None:
+            self._bouns_batch.process_collision(rects)
+
+    def start(self):
+        # pygame.mixer.init(channels=1, frequency=44100, size=-16, buffer=1024)
+        self._setup()
+        while self._running:
+            self.run_frame(self._clock.tick(self._fps))
+        self._teardown()
+
+    def run_frame(self, frame_time_ms: float):
+        self._elapsed_ms += frame_time_ms
+        profiler = self._profiler
+        start = profiler.begin()
+        self._handle_event()
+        profiler.end("phase/event", start)
+        self.advance(frame_time_ms)
+        self.camera.set_render_alpha(self.get_render_alpha())
+        start = profiler.begin()
+        self._cull()
+        profiler.end("phase/cull", start)
+        start = profiler.begin()
+        self._paint()
+        profiler.end("phase/paint", start)
+        start = profiler.begin()
+        self._present()
+        profiler.end("phase/present", start)
+        if profiler.enabled:
+            profiler.end_frame()
+
+    def _teardown(self):
+        if self._profile_path is not None:
+            self._profiler.export(self._profile_path)
+            logging.info("frame profile exported to %s", self._profile_path)
+        if self._guitar_input is not None:
+            self._guitar_input.on_destory()
+            logging.info(self._guitar_input.source.callback_stats.format())
+        if self._metronome is not None:
+            self._metronome.stop()
+        for path in self._preloaded_assets:
+            AssetManager.release(path)
+        # 缓存的 Surface 和 Sound 在 pygame.quit 之后失效
+        AssetManager.clear()
+        EventManager.clear()
+        pygame.quit()
+
+
+class Camera(ICamera):
+    def __init__(self, horizon_size: pygame.Vector2, position: pygame.Vector2) -> None:
+        super().__init__()
+        self._target: Optional[IActor] = None
+        self._target_relative_position = None
+        self._horizon_size = horizon_size
+        self._render_alpha = 1.0
+        self.set_position(position)
+
+    def get_render_alpha(self) -> float:
+        return self._render_alpha
+
+    def set_render_alpha(self, alpha: float):
+        self._render_alpha = alpha
+
+    def get_horizon_size(self) -> pygame.Vector2:
+        return self._horizon_size
+
+    def get_position(self):
+        return self._position
+
+    def set_position(self, position: pygame.Vector2):
+        # 视野矩形只在位置变化时重新计算, 每次可见性测试直接复用
+        self._position = pygame.Vector2(position)
+        self._view_rect = pygame.Rect(
+            position.x, position.y, self._horizon_size.x, self._horizon_size.y
+        )
+
+    def get_horizon_rect_in_world(self) -> pygame.Rect:
+        # 返回副本, 调用方原地修改 (inflate_ip 等) 不会影响可见性测试
+        return self._view_rect.copy()
+
+    def is_rect_visiable(self, rect: pygame.Rect) -> bool:
+        return self._view_rect.colliderect(rect)
+
+    def world_rect_to_screen(self, world_rect: pygame.Rect) -> pygame.Rect:
+        return world_rect.move(-self._position.x, -self._position.y)
+
+    def world_to_screen(self, world_position: pygame.Vector2) -> pygame.Vector2:
+        return world_position - self._position
+
+    def lock_target(self, target: IActor):
+        self._target = target
+
+    def unlock_target(self):
+        self._target = None
+
+    def get_target(self) -> Optional[IActor]:
+        return self._target
+
+    def get_target_relative_position(self) -> pygame.Vector2:
+        if self._target_relative_position is None:
+            raise ValueError
+        return self._target_relative_position
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--profile",
+        metavar="PATH",
+        help="从启动起记录每帧耗时, 退出时导出到 PATH (.csv 或 .json)",
+    )
+    args = parser.parse_args()
+    game = Game(profile_path=args.profile)
+    game.start()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,68 +1,59 @@
+import numpy as np
 import pygame
+from calibration import load_latency_ms
+from chart import NOTE_STATE, NoteChart
 from guitar_input import GuitarInput
+from metronome import BeatGrid, MetronomeScheduler
 
 pygame.init()
 clock = pygame.time.Clock()
-metronome_sound = pygame.mixer.Sound("metronome.wav")
-started_time = 0
-prev_beat_time = 0
-prev_note_time = 0
 bpm = 180
-beat_interval_ms = 60 / bpm * 1000
-note_interval_ms = beat_interval_ms / 1
-next_note_time = note_interval_ms
-is_prev_note_hit = False
-is_next_note_hit = False
+# 节拍器和谱面共用同一个节拍网格, 时间为网格上的毫秒数
+beat_grid = BeatGrid(bpm)
+metronome = MetronomeScheduler(beat_grid)
+beat_count = 10000
+note_subdivisions = (1,)
 coin_sound = pygame.mixer.Sound("coin.wav")
 
-hit_time_offset = 0
+# 由 calibration.py 测得的输入/输出往返延迟
+hit_time_offset = -load_latency_ms()
 
 allowed_error_ms = 30
 prefect_ms = 5
 good_ms = 10
 
+chart = NoteChart.from_beat_grid(
+    beat_grid,
+    beat_count,
+    note_subdivisions,
+    perfect_ms=prefect_ms,
+    good_ms=good_ms,
+    allowed_error_ms=allowed_error_ms,
+)
 
-def hit_callback(pitch: int):
-    # TODO: 需要加锁
-    global is_prev_note_hit, is_next_note_hit
-    hit_time = started_time + clock.get_rawtime() + hit_time_offset
-    prev_interval = hit_time - prev_note_time
-    next_interval = next_note_time - hit_time
-    error = min(prev_interval, next_interval)
-    assert prev_interval + next_interval > allowed_error_ms
-    if prev_interval < allowed_error_ms:
-        if not is_prev_note_hit:
-            coin_sound.play()
-            print(f"prev, error: {error}")
-            is_prev_note_hit = True
-        else:
-            print(f"repeat, error: {error}")
-            return
-    elif next_interval < allowed_error_ms:
-        is_next_note_hit = True
+
+def judge_hits(hits: np.ndarray):
+    """hits 为 GuitarInput.drain_hits 的结果, time_ms 为 PortAudio 时钟上的时间"""
+    hit_times = hits["time_ms"] + hit_time_offset - metronome.get_origin_time_ms()
+    for judgement in chart.judge(hit_times):
+        if judgement["note_index"] < 0:
+            print("mid")
+            continue
         coin_sound.play()
-        print(f"next, error: {error}")
-    else:
-        print(f"mid, prev_interval: {prev_interval}, next_interval:  {next_interval}")
-        pass
+        state = NOTE_STATE(judgement["state"])
+        print(f"{state.name.lower()}, error: {judgement['error_ms']:.1f}")
 
 
 if __name__ == "__main__":
-    guitar_input = GuitarInput(hit_callback)
+    guitar_input = GuitarInput()
+    guitar_input.on_setup()
+    metronome.start()
     try:
         while True:
-            started_time += clock.get_time()
+            judge_hits(guitar_input.drain_hits())
             clock.tick(120)
-            if started_time - prev_beat_time >= beat_interval_ms:
-                print("beat")
-                metronome_sound.play()
-                prev_beat_time = started_time
-            if started_time - prev_note_time >= note_interval_ms:
-                prev_note_time = started_time
-                next_note_time = started_time + note_interval_ms
-                if not is_prev_note_hit:
-                    print("miss")
-                is_prev_note_hit = is_next_note_hit
-                is_next_note_hit = False
+            for _ in chart.expire(metronome.get_time_ms()):
+                print("miss")
     except KeyboardInterrupt:
+        metronome.stop()
         pygame.quit()
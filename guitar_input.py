@@ -1,9 +1,56 @@
-from typing import Optional, Protocol, Tuple
+import wave
+from typing import Iterable, Iterator, List, Optional, Protocol, Tuple
 import numpy as np
-import pyaudio
-import aubio
 from numpy.typing import NDArray
 
+from audio_source import (
+    GeneratorSource,
+    IAudioSource,
+    PyAudioSource,
+    WavFileSource,
+    pcm_to_float32,
+)
+from chord import ChordAnalyzer, pitches_to_mask
+from ring_buffer import RingBuffer
+
+# 每个 onset 一条记录, strength 为 onset 检测函数的值
+HIT_DTYPE = np.dtype(
+    [
+        ("sample_index", np.int64),
+        ("time_ms", np.float64),
+        ("pitch", np.int16),
+        ("strength", np.float32),
+    ]
+)
+
+# 启用和弦分析时追加: chord 为 CHORD_LABELS 的下标 (-1 为无和弦), pitches 为音高掩码
+CHORD_HIT_DTYPE = np.dtype(
+    HIT_DTYPE.descr + [("chord", np.int16), ("pitches", np.uint64)]
+)
+
+
+def chord_window_dtype(hit_dtype: np.dtype, fft_size: int) -> np.dtype:
+    """
+    启用和弦分析时音频回调写入环形缓冲区的记录: hit_dtype 之后追加 analysis_delay 时的
+    FFT 窗口 (window), 由消费者用 analyze_chord_windows 换成 chord / pitches
+    """
+    return np.dtype(hit_dtype.descr + [("window", np.float32, (fft_size,))])
+
+
+def analyze_chord_windows(
+    records: NDArray, analyzer: ChordAnalyzer, dtype: np.dtype
+) -> NDArray:
+    """消费者线程调用: 分析 records 中的 window, 返回 dtype 的记录, 其余同名字段原样复制"""
+    hits = np.zeros(len(records), dtype=dtype)
+    for name in dtype.names:
+        if name in records.dtype.names:
+            hits[name] = records[name]
+    for hit, window in zip(hits, records["window"]):
+        pitches, chord = analyzer.analyze(window)
+        hit["chord"] = chord
+        hit["pitches"] = pitches_to_mask(pitches)
+    return hits
+
 
 class IOnsetDetector(Protocol):
     def __call__(self, data: np.ndarray) -> bool:
@@ -12,6 +59,12 @@ class IOnsetDetector(Protocol):
     def set_threshold(self, threshold: float) -> None:
         raise NotImplementedError
 
+    def get_last(self) -> int:
+        raise NotImplementedError
+
+    def get_descriptor(self) -> float:
+        raise NotImplementedError
+
 
 class IPitchDetector(Protocol):
     def __call__(self, data: NDArray[np.float32]) -> Tuple[float]:
@@ -24,67 +77,351 @@ class IPitchDetector(Protocol):
         raise NotImplementedError
 
 
-class HitCallback(Protocol):
-    def __call__(self, pitch: int):
-        """
-        pitch: 音高 (MIDI 音符编号 0-127  C4 对应 60)
-        """
-        raise NotImplementedError
+def create_onset_detector(
+    buffer_size: int, hop_size: int, sample_rate: int
+) -> IOnsetDetector:
+    # aubio 导入需要约 100ms, 只在真正创建检测器时导入
+    import aubio
+
+    detector: IOnsetDetector = aubio.onset(  # type: ignore
+        "default", buffer_size, hop_size, sample_rate
+    )
+    detector.set_threshold(0.2)
+    return detector
+
+
+def create_pitch_detector(
+    buffer_size: int, hop_size: int, sample_rate: int
+) -> IPitchDetector:
+    import aubio
+
+    detector: IPitchDetector = aubio.pitch(  # type: ignore
+        "default", buffer_size, hop_size, sample_rate
+    )
+    detector.set_unit("midi")
+    detector.set_silence(-40)
+    return detector
+
+
+class ChannelDetector:
+    """
+    一个声道的 onset / pitch 检测, 检测器的状态在连续的 hop 之间保留。
+
+    给出 chord_analyzer 时每个 hop 都送入它的窗口, hit 后追加这时的 FFT 窗口 (window),
+    和弦分析本身由消费者用 analyze_chord_windows 完成, 不占用音频回调的时间。
+    onset 刚发生时 FFT 窗口里几乎全是上一个和弦, 所以带和弦的 hit 推迟
+    analysis_delay 个采样才返回, time_ms 仍是 onset 的时间;
+    推迟期间 STRUM_MS 之内的 onset 是同一次扫弦的后几根弦, 并入前一个 hit,
+    更晚的 onset 先用当时的窗口返回前一个。
+    返回的 window 是检测器内部数组的引用, 要在下一次 process 之前复制 (如写入环形缓冲区)。
+    """
+
+    # 一次扫弦从第一根弦到最后一根弦的最大时长
+    STRUM_MS = 60
+
+    def __init__(
+        self,
+        buffer_size: int,
+        hop_size: int,
+        sample_rate: int,
+        chord_analyzer: Optional[ChordAnalyzer] = None,
+    ) -> None:
+        self._sample_rate = sample_rate
+        self._pitch_detector = create_pitch_detector(buffer_size, hop_size, sample_rate)
+        self._onset_detector = create_onset_detector(buffer_size, hop_size, sample_rate)
+        self._chord_analyzer = chord_analyzer
+        self._pending_hit: Optional[Tuple] = None
+        self._pending_samples = 0
+        self._strum_samples = self.STRUM_MS * sample_rate // 1000
+
+    def process(
+        self, samples: NDArray[np.float32], hop_start_sample: int, adc_time: float
+    ) -> Optional[Tuple]:
+        """返回 (sample_index, time_ms, pitch, strength[, window]) 或 None"""
+        [pitch] = self._pitch_detector(samples)
+        if self._chord_analyzer is not None:
+            self._chord_analyzer.process(samples)
+        if not self._onset_detector(samples):
+            return self._process_pending_hit(len(samples))
+        sample_index = self._onset_detector.get_last()
+        if (
+            self._pending_hit is not None
+            and sample_index - self._pending_hit[0] < self._strum_samples
+        ):
+            return self._process_pending_hit(len(samples))
+        # get_last 已扣除检测延迟, 可能落在本 hop 之前, 偏移为负
+        offset_s = (sample_index - hop_start_sample) / self._sample_rate
+        hit = (
+            sample_index,
+            (adc_time + offset_s) * 1000,
+            round(pitch),
+            self._onset_detector.get_descriptor(),
+        )
+        if self._chord_analyzer is None:
+            return hit
+        previous_hit = self._finish_pending_hit()
+        self._pending_hit = hit
+        self._pending_samples = hop_start_sample + len(samples) - sample_index
+        return previous_hit
+
+    def _process_pending_hit(self, hop_size: int) -> Optional[Tuple]:
+        if self._pending_hit is None:
+            return None
+        self._pending_samples += hop_size
+        assert self._chord_analyzer is not None
+        if self._pending_samples < self._chord_analyzer.analysis_delay:
+            return None
+        return self._finish_pending_hit()
+
+    def flush(self) -> Optional[Tuple]:
+        """音频流结束或停止时调用, 用当时的窗口返回还在推迟中的 hit"""
+        if self._chord_analyzer is None:
+            return None
+        return self._finish_pending_hit()
+
+    def _finish_pending_hit(self) -> Optional[Tuple]:
+        hit = self._pending_hit
+        if hit is None:
+            return None
+        self._pending_hit = None
+        assert self._chord_analyzer is not None
+        return hit + (self._chord_analyzer.window,)
 
 
 class GuitarInput:
-    def __init__(self, hit_callback: HitCallback) -> None:
+    """
+    音频回调线程只把 onset 写入预分配的环形缓冲区, 游戏循环每帧调用 drain_hits 取出,
+    回调线程中不分配内存也不调用任何游戏逻辑。
+    记录中 pitch 为音高 (MIDI 音符编号 0-127  C4 对应 60),
+    time_ms 为 onset 在音频源时钟上的绝对时间, 精确到采样, 与 get_time_ms 可直接比较。
+
+    采样率和 hop 由音频源决定, 默认使用声卡 (PyAudioSource);
+    buffer_size 为检测窗口, 默认为两个 hop。hop 越小延迟越低, CPU 开销越大。
+    chords=True 时记录为 CHORD_HIT_DTYPE, 附带扫弦的和弦与同时发声的音高,
+    每条记录比 onset 晚 analysis_delay 个采样 (默认约 140ms) 送达。
+    回调只保存 FFT 窗口, FFT 和音高估计在 drain_hits 中 (游戏循环线程) 进行。
+    """
+
+    def __init__(
+        self,
+        source: Optional[IAudioSource] = None,
+        buffer_size: Optional[int] = None,
+        hit_capacity: int = 256,
+        chords: bool = False,
+    ) -> None:
+        self._source = PyAudioSource() if source is None else source
+        if self._source.channels != 1:
+            raise ValueError("GuitarInput is mono, use MultiChannelGuitarInput")
         self._is_recording = False
-        self._sample_rate = 44100
-        self._buffer_size = 512
-        self._hit_callback = hit_callback
-        self._inner_pitch_detector: IPitchDetector = aubio.pitch(  # type: ignore
-            "default", self._buffer_size, self._buffer_size // 2, self._sample_rate
+        self._sample_rate = self._source.sample_rate
+        hop_size = self._source.hop_size
+        self._buffer_size = 2 * hop_size if buffer_size is None else buffer_size
+        self._processed_samples = 0
+        # 回调和消费者各用一个 ChordAnalyzer: 前者只维护窗口, 后者做分析
+        self._chord_analyzer = ChordAnalyzer(self._sample_rate) if chords else None
+        self._hits = RingBuffer(
+            (
+                HIT_DTYPE
+                if self._chord_analyzer is None
+                else chord_window_dtype(HIT_DTYPE, self._chord_analyzer.fft_size)
+            ),
+            hit_capacity,
         )
-        self._inner_onset_detector: IOnsetDetector = aubio.onset(  # type: ignore
-            "default", self._buffer_size, self._buffer_size // 2, self._sample_rate
-        )
-        self._inner_onset_detector.set_threshold(0.2)
-        self._inner_pitch_detector.set_unit("midi")
-        self._inner_pitch_detector.set_silence(-40)
-        self._pyaudio = pyaudio.PyAudio()
-        self._stream = self._pyaudio.open(
-            format=pyaudio.paFloat32,
-            channels=1,
-            rate=self._sample_rate,
-            input=True,
-            input_device_index=0,
-            frames_per_buffer=self._buffer_size // 2,
-            stream_callback=self._process_audio_callback,
+        # 回调停止后取回的推迟中的 hit, 由消费者持有, 不写入单生产者的 _hits
+        self._flushed_hits: List[Tuple] = []
+        self._detector = ChannelDetector(
+            self._buffer_size,
+            hop_size,
+            self._sample_rate,
+            ChordAnalyzer(self._sample_rate) if chords else None,
         )
 
-    def _process_audio_callback(
-        self, in_data: Optional[bytes], frame_count: int, time_info, status
-    ):
-        if in_data is None:
-            return None, pyaudio.paContinue
-        samples = np.frombuffer(in_data, dtype=np.float32)
-        [pitch] = self._inner_pitch_detector(samples)
-        onset = self._inner_onset_detector(samples)
-        if onset:
-            self._hit_callback(round(pitch))
-        return in_data, pyaudio.paContinue
+    @property
+    def source(self) -> IAudioSource:
+        return self._source
+
+    def _process_hop(self, samples: NDArray[np.float32], adc_time: float):
+        hop_start_sample = self._processed_samples
+        self._processed_samples += len(samples)
+        hit = self._detector.process(samples, hop_start_sample, adc_time)
+        if hit is not None:
+            self._hits.push(hit)
+
+    def _flush(self):
+        """只在回调不再运行时由消费者调用, hit 留给下一次 drain_hits"""
+        hit = self._detector.flush()
+        if hit is not None:
+            self._flushed_hits.append(hit)
+
+    def get_time_ms(self) -> float:
+        """当前音频源时钟, 与 hit 记录的 time_ms 同一时钟"""
+        return self._source.get_time_ms()
+
+    def drain_hits(self) -> NDArray:
+        """游戏循环每帧调用一次, 返回上次调用以来的所有 HIT_DTYPE (或 CHORD_HIT_DTYPE) 记录"""
+        # 回放结束后不会再有回调, 在这里交付最后一个推迟中的和弦 hit
+        if isinstance(self._source, GeneratorSource) and self._source.finished:
+            self._flush()
+        hits = self._hits.drain()
+        if self._flushed_hits:
+            flushed = np.array(self._flushed_hits, dtype=hits.dtype)
+            self._flushed_hits.clear()
+            hits = np.concatenate((hits, flushed))
+        if self._chord_analyzer is None:
+            return hits
+        return analyze_chord_windows(hits, self._chord_analyzer, CHORD_HIT_DTYPE)
+
+    def process_until(self, time_ms: float):
+        """回放源不启动线程时, 由调用方的时钟同步推进到 time_ms"""
+        if not isinstance(self._source, GeneratorSource):
+            raise TypeError(
+                "process_until needs a replay source (GeneratorSource, ArraySource, "
+                f"WavFileSource), got {type(self._source).__name__}"
+            )
+        self._source.process_until(time_ms, self._process_hop)
 
     def on_destory(self):
         self._is_recording = False
-        self._stream.stop_stream()
+        self._source.stop()
+        # 回调已经停止, 推迟中的 hit 留给之后的 drain_hits
+        self._flush()
 
     def on_setup(self):
-        self._recording = True
-        self._stream.start_stream()
+        self._is_recording = True
+        self._source.start(self._process_hop)
+
+
+class OfflineGuitarAnalyzer:
+    """
+    不依赖声卡, 以远快于实时的速度对 WAV 文件或 NumPy 数组做与 GuitarInput 相同的
+    onset / pitch 检测, 用于回归测试和性能测试。
+
+    onset 检测逐个 hop 进行 (检测器有状态), 音高只在触发 onset 的 hop 上计算:
+    对以该 hop 结尾的 buffer_size 窗口调用 hop == buffer_size 的音高检测器,
+    结果与实时流水线逐 hop 喂数据完全一致。
+    """
+
+    def __init__(
+        self,
+        sample_rate: int = 44100,
+        buffer_size: int = 512,
+        hop_size: Optional[int] = None,
+        block_size: int = 1 << 16,
+    ) -> None:
+        self._sample_rate = sample_rate
+        self._buffer_size = buffer_size
+        self._hop_size = buffer_size // 2 if hop_size is None else hop_size
+        if not 0 < self._hop_size <= self._buffer_size:
+            raise ValueError("hop_size must be in (0, buffer_size]")
+        self._block_size = block_size
+
+    @property
+    def sample_rate(self) -> int:
+        return self._sample_rate
+
+    @property
+    def hop_size(self) -> int:
+        return self._hop_size
+
+    def analyze(self, samples: NDArray) -> NDArray:
+        samples = np.asarray(samples, dtype=np.float32)
+        if samples.ndim != 1:
+            raise ValueError("samples must be mono")
+        return self.analyze_blocks(
+            samples[i : i + self._block_size]
+            for i in range(0, len(samples), self._block_size)
+        )
+
+    def analyze_wav(self, path: str) -> NDArray:
+        with wave.open(path, "rb") as wav:
+            if wav.getframerate() != self._sample_rate:
+                raise ValueError(
+                    f"sample rate mismatch: {wav.getframerate()} != {self._sample_rate}"
+                )
+            return self.analyze_blocks(self._iter_wav_blocks(wav))
+
+    def _iter_wav_blocks(self, wav: wave.Wave_read) -> Iterator[NDArray[np.float32]]:
+        channels = wav.getnchannels()
+        sample_width = wav.getsampwidth()
+        while True:
+            frames = wav.readframes(self._block_size)
+            if not frames:
+                return
+            yield pcm_to_float32(frames, sample_width, channels)
+
+    def analyze_blocks(self, blocks: Iterable[NDArray[np.float32]]) -> NDArray:
+        buffer_size = self._buffer_size
+        hop_size = self._hop_size
+        onset_detector = create_onset_detector(buffer_size, hop_size, self._sample_rate)
+        pitch_detector = create_pitch_detector(
+            buffer_size, buffer_size, self._sample_rate
+        )
+
+        # data 的前 buffer_size 个采样是已处理部分的末尾 (初始为静音, 与 aubio 内部缓冲一致),
+        # 之后是尚未凑够一个 hop 的剩余采样和新的数据块
+        carry = np.zeros(buffer_size, dtype=np.float32)
+        sample_indexes = []
+        pitches = []
+        strengths = []
+        for block in blocks:
+            data = np.concatenate((carry, np.asarray(block, dtype=np.float32)))
+            end = buffer_size + (len(data) - buffer_size) // hop_size * hop_size
+            for start in range(buffer_size, end, hop_size):
+                if onset_detector(data[start : start + hop_size]):
+                    stop = start + hop_size
+                    [pitch] = pitch_detector(data[stop - buffer_size : stop])
+                    sample_indexes.append(onset_detector.get_last())
+                    pitches.append(pitch)
+                    strengths.append(onset_detector.get_descriptor())
+            carry = data[end - buffer_size :]
+
+        hits = np.empty(len(sample_indexes), dtype=HIT_DTYPE)
+        hits["sample_index"] = sample_indexes
+        hits["time_ms"] = hits["sample_index"] * (1000 / self._sample_rate)
+        hits["pitch"] = np.rint(pitches)
+        hits["strength"] = strengths
+        return hits
 
 
 if __name__ == "__main__":
+    import argparse
+    import time
 
-    def hit(pitch: int):
-        print("hit")
+    from chord import CHORD_LABELS, mask_to_pitches
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--wav", help="回放 WAV 文件而不是录音")
+    parser.add_argument("--hop", type=int, default=256)
+    parser.add_argument(
+        "--realtime", action="store_true", help="按实时速度回放, 默认尽快回放"
+    )
+    parser.add_argument("--chords", action="store_true", help="同时输出和弦")
+    args = parser.parse_args()
+    if args.wav is None:
+        source: IAudioSource = PyAudioSource(hop_size=args.hop)
+    else:
+        source = WavFileSource(args.wav, hop_size=args.hop, realtime=args.realtime)
+
+    def print_hit(hit):
+        chord = ""
+        if args.chords:
+            label = CHORD_LABELS[hit["chord"]] if hit["chord"] >= 0 else "-"
+            chord = f", chord: {label} {mask_to_pitches(int(hit['pitches']))}"
+        print(
+            f"hit at {hit['time_ms']:.1f} ms, pitch: {hit['pitch']}, "
+            f"strength: {hit['strength']:.2f}{chord}"
+        )
 
-    guitar_input = GuitarInput(hit)
+    guitar_input = GuitarInput(source, chords=args.chords)
     guitar_input.on_setup()
-    input("按回车键停止录音...")
+    print("按 Ctrl+C 停止...")
+    try:
+        while not (isinstance(source, GeneratorSource) and source.finished):
+            for hit in guitar_input.drain_hits():
+                print_hit(hit)
+            time.sleep(0.01)
+        for hit in guitar_input.drain_hits():
+            print_hit(hit)
+    except KeyboardInterrupt:
+        pass
     guitar_input.on_destory()
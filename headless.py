@@ -0,0 +1,124 @@
+"""
+无头运行: 使用 SDL 的 dummy 显示/音频驱动和虚拟时钟, 按脚本注入输入事件,
+模拟结果只取决于脚本和帧时间, 可以远快于实时地运行。
+"""
+
+import bisect
+import os
+import time
+from typing import Callable, Dict, Iterable, List, Tuple
+
+import numpy as np
+from numpy.typing import NDArray
+
+from base import IEvent
+from event import KEY_TYPE, EventManager, GuitarHitEvent, KeyDownEvent
+
+
+class VirtualClock:
+    """与 pygame.time.Clock 接口相同, 每次 tick 固定前进 frame_time_ms"""
+
+    def __init__(self, frame_time_ms: float = 1000 / 60) -> None:
+        self._frame_time_ms = frame_time_ms
+        self._time_ms = 0.0
+
+    def tick(self, framerate: float = 0) -> float:
+        self._time_ms += self._frame_time_ms
+        return self._frame_time_ms
+
+    def get_time(self) -> float:
+        return self._frame_time_ms
+
+    def get_rawtime(self) -> float:
+        return self._frame_time_ms
+
+    def get_ticks(self) -> float:
+        return self._time_ms
+
+
+class ScriptedInput:
+    """按时间排序的输入事件脚本"""
+
+    def __init__(self) -> None:
+        self._times_ms: List[float] = []
+        self._events: List[IEvent] = []
+        self._next = 0
+
+    def add(self, time_ms: float, event: IEvent):
+        index = bisect.bisect_right(self._times_ms, time_ms)
+        self._times_ms.insert(index, time_ms)
+        self._events.insert(index, event)
+
+    def add_guitar_hits(self, times_ms: Iterable[float], pitch: int = 60):
+        for time_ms in times_ms:
+            self.add(time_ms, GuitarHitEvent(pitch, time_ms))
+
+    def add_key_downs(self, times_ms: Iterable[float], key_type=KEY_TYPE.SPACE):
+        for time_ms in times_ms:
+            self.add(time_ms, KeyDownEvent(key_type))
+
+    def post_due_events(self, now_ms: float):
+        while self._next < len(self._times_ms) and self._times_ms[self._next] <= now_ms:
+            EventManager.post_event(self._events[self._next])
+            self._next += 1
+
+
+class HeadlessRunner:
+    """
+    驱动一个 audio_io=False 的 Game, 记录每帧各阶段的耗时 (毫秒):
+    event, update, collision, cull, paint, present。一帧内有多个模拟步时 update/collision 为总和。
+    """
+
+    PHASES = {
+        "event": "_handle_event",
+        "update": "_update_status",
+        "collision": "_process_collision",
+        "cull": "_cull",
+        "paint": "_paint",
+        "present": "_present",
+    }
+
+    def __init__(self, game, script: ScriptedInput, fps: float = 60) -> None:
+        os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+        os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+        self._game = game
+        self._script = script
+        self._clock = VirtualClock(1000 / fps)
+        self._frame_timings: Dict[str, float] = {}
+        for phase, method_name in self.PHASES.items():
+            self._wrap_phase(phase, method_name)
+
+    def _wrap_phase(self, phase: str, method_name: str):
+        method = getattr(self._game, method_name)
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter_ns()
+            result = method(*args, **kwargs)
+            elapsed = (time.perf_counter_ns() - start) / 1e6
+            self._frame_timings[phase] = self._frame_timings.get(phase, 0) + elapsed
+            return result
+
+        setattr(self._game, method_name, timed)
+
+    def setup(self, prepare: Callable[[object], None] = lambda game: None):
+        self._game._setup()
+        prepare(self._game)
+
+    def run(self, duration_ms: float) -> Dict[str, NDArray[np.float64]]:
+        timings: Dict[str, List[float]] = {phase: [] for phase in self.PHASES}
+        while self._clock.get_ticks() < duration_ms and self._game.running:
+            self._script.post_due_events(self._clock.get_ticks())
+            self._frame_timings.clear()
+            self._game.run_frame(self._clock.tick())
+            for phase in self.PHASES:
+                timings[phase].append(self._frame_timings.get(phase, 0.0))
+        return {phase: np.array(values) for phase, values in timings.items()}
+
+    def teardown(self):
+        self._game._teardown()
+
+
+def summarize(timings: NDArray[np.float64]) -> Tuple[float, float, float]:
+    """p50, p95, p99"""
+    p50, p95, p99 = np.percentile(timings, (50, 95, 99))
+    return float(p50), float(p95), float(p99)
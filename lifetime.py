@@ -0,0 +1,94 @@
+from typing import Dict, Iterable, List, Tuple, Type
+
+import numpy as np
+import pygame
+
+from base import IActor, ICamera
+from capabilities import CAPABILITY, get_capabilities
+
+
+class CullingSystem:
+    """
+    每帧在绘制之前运行一次: 用所有 ICullable actor 的包围盒一次性算出
+    哪些在视野内 (需要绘制)、哪些离开了保留区域 (需要回收)。
+
+    保留区域是视野向四周扩展 margin 之后, 再向前方 (卷轴方向, 默认右侧)
+    扩展 spawn_ahead 得到的矩形: 在前方屏幕外生成的 actor 不会被立即回收,
+    刚离开视野的 actor 在 margin 内也不会被回收, 绘制和回收的边界因此错开。
+    """
+
+    def __init__(
+        self,
+        margin: int = 64,
+        spawn_ahead: Tuple[int, int, int, int] = (0, 0, 640, 0),
+    ) -> None:
+        self._margin = margin
+        # 视野的 left, top, right, bottom 四个方向各额外保留的距离
+        self._spawn_ahead = spawn_ahead
+        self._cullable_types: Dict[Type[IActor], bool] = {}
+        self._batch_types: Dict[Type[IActor], bool] = {}
+        self._culled_count = 0
+
+    def _is_cullable(self, actor_type: Type[IActor]) -> bool:
+        cullable = self._cullable_types.get(actor_type)
+        if cullable is None:
+            cullable = CAPABILITY.CULLABLE in get_capabilities(actor_type)
+            self._cullable_types[actor_type] = cullable
+        return cullable
+
+    def _is_batch(self, actor_type: Type[IActor]) -> bool:
+        batch = self._batch_types.get(actor_type)
+        if batch is None:
+            batch = CAPABILITY.BATCH_CULLABLE in get_capabilities(actor_type)
+            self._batch_types[actor_type] = batch
+        return batch
+
+    def get_keep_rect(self, camera: ICamera) -> pygame.Rect:
+        view = camera.get_horizon_rect_in_world()
+        left, top, right, bottom = self._spawn_ahead
+        margin = self._margin
+        return pygame.Rect(
+            view.left - margin - left,
+            view.top - margin - top,
+            view.width + 2 * margin + left + right,
+            view.height + 2 * margin + top + bottom,
+        )
+
+    def get_culled_count(self) -> int:
+        """累计回收的 actor 和批量精灵数"""
+        return self._culled_count
+
+    def run(
+        self, actors: Iterable[IActor], camera: ICamera
+    ) -> Tuple[List[IActor], List[IActor]]:
+        """返回 (需要绘制的 actor, 需要回收的 actor); 批量精灵直接在这里回收"""
+        keep_rect = self.get_keep_rect(camera)
+        actors = list(actors)
+        # 不可剔除的 actor 总是绘制, 保持原有的绘制顺序
+        draw_mask = np.ones(len(actors), dtype=bool)
+        indexes: List[int] = []
+        for index, actor in enumerate(actors):
+            actor_type = type(actor)
+            if self._is_cullable(actor_type):
+                indexes.append(index)
+            elif self._is_batch(actor_type):
+                self._culled_count += actor.despawn_outside(keep_rect)
+        if not indexes:
+            return actors, []
+
+        bounds = np.array(
+            [tuple(actors[index].get_world_rect()) for index in indexes],
+            dtype=np.float64,
+        )
+        bounds[:, 2:] += bounds[:, :2]
+        draw_mask[indexes] = camera.cull_bounds(bounds)
+        keep = (
+            (bounds[:, 0] < keep_rect.right)
+            & (keep_rect.left < bounds[:, 2])
+            & (bounds[:, 1] < keep_rect.bottom)
+            & (keep_rect.top < bounds[:, 3])
+        )
+        drawn = [actors[index] for index in np.flatnonzero(draw_mask).tolist()]
+        culled = [actors[indexes[i]] for i in np.flatnonzero(~keep).tolist()]
+        self._culled_count += len(culled)
+        return drawn, culled
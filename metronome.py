@@ -0,0 +1,308 @@
+"""
+采样精确的节拍器:
+
+    python metronome.py --bpm 120 --beats-per-bar 4  # 播放节拍器
+    python metronome.py --check                      # 检查 10000 拍的累计漂移
+
+BeatGrid 直接由拍号计算每一拍的采样位置, 不做累加, 因此没有累计误差;
+MetronomeScheduler 在音频输出回调中把点击声按采样位置混入输出流, 与渲染帧率无关。
+"""
+
+import argparse
+import math
+import wave
+from dataclasses import dataclass
+from typing import List, Optional
+
+import numpy as np
+from numpy.typing import NDArray
+
+
+@dataclass(frozen=True)
+class TempoSegment:
+    start_beat: int
+    # 该段第一拍的精确采样位置, 保留小数以免换速时引入舍入误差
+    start_position: float
+    bpm: float
+    beats_per_bar: int
+
+    def samples_per_beat(self, sample_rate: int) -> float:
+        return sample_rate * 60 / self.bpm
+
+
+class BeatGrid:
+    def __init__(
+        self, bpm: float, sample_rate: int = 44100, beats_per_bar: int = 4
+    ) -> None:
+        self._sample_rate = sample_rate
+        self._segments: List[TempoSegment] = [TempoSegment(0, 0.0, bpm, beats_per_bar)]
+
+    @property
+    def sample_rate(self) -> int:
+        return self._sample_rate
+
+    def set_tempo(
+        self, bpm: float, at_beat: int, beats_per_bar: Optional[int] = None
+    ) -> None:
+        """从第 at_beat 拍开始改变速度和拍号, 之后的变化会被丢弃"""
+        segment = self._get_segment(at_beat)
+        self._segments = [s for s in self._segments if s.start_beat < at_beat]
+        self._segments.append(
+            TempoSegment(
+                at_beat,
+                self.beat_position(at_beat, segment),
+                bpm,
+                segment.beats_per_bar if beats_per_bar is None else beats_per_bar,
+            )
+        )
+
+    def _get_segment(self, beat: int) -> TempoSegment:
+        for segment in reversed(self._segments):
+            if segment.start_beat <= beat:
+                return segment
+        return self._segments[0]
+
+    def _get_segment_at_position(self, position: float) -> TempoSegment:
+        for segment in reversed(self._segments):
+            if segment.start_position <= position:
+                return segment
+        return self._segments[0]
+
+    def get_bpm(self, beat: int) -> float:
+        return self._get_segment(beat).bpm
+
+    def beat_position(self, beat: int, segment: Optional[TempoSegment] = None) -> float:
+        if segment is None:
+            segment = self._get_segment(beat)
+        return segment.start_position + (
+            beat - segment.start_beat
+        ) * segment.samples_per_beat(self._sample_rate)
+
+    def beat_positions(self, beats: NDArray) -> NDArray[np.float64]:
+        """beat_position 的向量化版本, 支持小数拍号 (细分音符)"""
+        beats = np.asarray(beats, dtype=np.float64)
+        start_beats = np.array([s.start_beat for s in self._segments])
+        indexes = np.maximum(np.searchsorted(start_beats, beats, side="right") - 1, 0)
+        start_positions = np.array([s.start_position for s in self._segments])
+        samples_per_beat = np.array(
+            [s.samples_per_beat(self._sample_rate) for s in self._segments]
+        )
+        return (
+            start_positions[indexes]
+            + (beats - start_beats[indexes]) * samples_per_beat[indexes]
+        )
+
+    def beat_sample(self, beat: int) -> int:
+        return math.floor(self.beat_position(beat) + 0.5)
+
+    def beat_time_ms(self, beat: int) -> float:
+        return self.beat_position(beat) * 1000 / self._sample_rate
+
+    def beat_at_sample(self, sample: float) -> float:
+        """beat_position 的反函数, 返回小数拍号"""
+        segment = self._get_segment_at_position(sample)
+        return segment.start_beat + (
+            sample - segment.start_position
+        ) / segment.samples_per_beat(self._sample_rate)
+
+    def beat_at_time_ms(self, time_ms: float) -> float:
+        return self.beat_at_sample(time_ms * self._sample_rate / 1000)
+
+    def is_downbeat(self, beat: int) -> bool:
+        segment = self._get_segment(beat)
+        return (beat - segment.start_beat) % segment.beats_per_bar == 0
+
+    def beats_in_range(self, start_sample: int, stop_sample: int) -> NDArray[np.int64]:
+        """采样位置落在 [start_sample, stop_sample) 内的所有拍号"""
+        first = math.ceil(self.beat_at_sample(start_sample - 0.5))
+        last = math.ceil(self.beat_at_sample(stop_sample - 0.5))
+        # 换速点附近反函数与取整可能差一拍, 用精确位置修正
+        while first > 0 and self.beat_sample(first - 1) >= start_sample:
+            first -= 1
+        while self.beat_sample(first) < start_sample:
+            first += 1
+        while last > first and self.beat_sample(last - 1) >= stop_sample:
+            last -= 1
+        while self.beat_sample(last) < stop_sample:
+            last += 1
+        return np.arange(max(first, 0), last, dtype=np.int64)
+
+
+def load_click(path: str = "metronome.wav") -> NDArray[np.float32]:
+    from audio_source import pcm_to_float32
+
+    with wave.open(path, "rb") as wav:
+        return pcm_to_float32(
+            wav.readframes(wav.getnframes()), wav.getsampwidth(), wav.getnchannels()
+        )
+
+
+def make_accent(click: NDArray[np.float32], pitch_ratio: float = 1.5) -> NDArray:
+    """把点击声升调并放大, 作为重拍"""
+    positions = np.arange(0, len(click) - 1, pitch_ratio)
+    accent = np.interp(positions, np.arange(len(click)), click) * 1.5
+    return np.clip(accent, -1, 1).astype(np.float32)
+
+
+class MetronomeScheduler:
+    """
+    在音频输出回调中渲染节拍器: 每个 block 查询 BeatGrid 在该区间内的拍子,
+    按精确采样位置混入点击声, 跨 block 的点击尾部在下一个 block 继续混入。
+    """
+
+    def __init__(
+        self,
+        grid: BeatGrid,
+        click: Optional[NDArray[np.float32]] = None,
+        accent: Optional[NDArray[np.float32]] = None,
+        click_gain: float = 0.6,
+        block_size: int = 256,
+    ) -> None:
+        self._grid = grid
+        self._click = (load_click() if click is None else click) * click_gain
+        self._accent = make_accent(self._click) if accent is None else accent
+        self._block_size = block_size
+        self._output = np.zeros(block_size, dtype=np.float32)
+        self._position = 0
+        # 正在播放的点击: [声音, 已播放的采样数]
+        self._voices: List[list] = []
+        self._origin_time: Optional[float] = None
+        self._stream = None
+        self._pyaudio = None
+
+    @property
+    def grid(self) -> BeatGrid:
+        return self._grid
+
+    def get_position(self) -> int:
+        """已渲染的采样数"""
+        return self._position
+
+    def render(self, frame_count: int) -> NDArray[np.float32]:
+        if len(self._output) < frame_count:
+            self._output = np.zeros(frame_count, dtype=np.float32)
+        output = self._output[:frame_count]
+        output.fill(0)
+
+        start = self._position
+        stop = start + frame_count
+        for beat in self._grid.beats_in_range(start, stop):
+            sound = self._accent if self._grid.is_downbeat(beat) else self._click
+            self._voices.append([sound, start - self._grid.beat_sample(beat)])
+
+        remaining = []
+        for voice in self._voices:
+            sound, played = voice
+            offset = max(-played, 0)
+            begin = max(played, 0)
+            length = min(frame_count - offset, len(sound) - begin)
+            output[offset : offset + length] += sound[begin : begin + length]
+            voice[1] = played + frame_count
+            if voice[1] < len(sound):
+                remaining.append(voice)
+        self._voices = remaining
+        self._position = stop
+        return output
+
+    def _process_audio_callback(
+        self, in_data: Optional[bytes], frame_count: int, time_info, status
+    ):
+        if self._origin_time is None:
+            dac_time = time_info["output_buffer_dac_time"] or time_info["current_time"]
+            self._origin_time = dac_time - self._position / self._grid.sample_rate
+        return self.render(frame_count).tobytes(), self._continue_flag
+
+    def get_time_ms(self) -> float:
+        """当前正在播放的位置在节拍网格上的时间, 音频输出开始前为 0"""
+        if self._stream is None or self._origin_time is None:
+            return 0.0
+        return (self._stream.get_time() - self._origin_time) * 1000
+
+    def get_origin_time_ms(self) -> float:
+        """网格第 0 个采样在 PortAudio 时钟上的时间"""
+        return 0.0 if self._origin_time is None else self._origin_time * 1000
+
+    def start(self):
+        import pyaudio
+
+        self._continue_flag = pyaudio.paContinue
+        self._pyaudio = pyaudio.PyAudio()
+        self._stream = self._pyaudio.open(
+            format=pyaudio.paFloat32,
+            channels=1,
+            rate=self._grid.sample_rate,
+            output=True,
+            frames_per_buffer=self._block_size,
+            stream_callback=self._process_audio_callback,
+        )
+
+    def stop(self):
+        if self._stream is None:
+            return
+        self._stream.stop_stream()
+        self._stream.close()
+        self._pyaudio.terminate()
+        self._stream = None
+        self._pyaudio = None
+
+
+def check_drift(beat_count: int = 10000, sample_rate: int = 44100):
+    """
+    用单采样脉冲作为点击, 以不规则的 block 大小渲染 beat_count 拍,
+    检查每一拍的实际采样位置与按拍号直接计算的位置完全一致 (累计漂移为 0)。
+    """
+    bpm = 173.0
+    change_beat = beat_count // 2
+    grid = BeatGrid(bpm, sample_rate, beats_per_bar=3)
+    grid.set_tempo(97.0, change_beat, beats_per_bar=4)
+    impulse = np.ones(1, dtype=np.float32)
+    scheduler = MetronomeScheduler(grid, impulse, impulse * 2, click_gain=1)
+
+    block_sizes = np.random.default_rng(0).integers(64, 1024, size=1024)
+    positions = []
+    end = grid.beat_sample(beat_count)
+    i = 0
+    while scheduler.get_position() < end:
+        start = scheduler.get_position()
+        output = scheduler.render(int(block_sizes[i % len(block_sizes)]))
+        positions.extend(start + np.flatnonzero(output))
+        i += 1
+
+    positions = np.asarray(positions[:beat_count])
+    samples_per_beat = np.where(
+        np.arange(beat_count) < change_beat,
+        sample_rate * 60 / bpm,
+        sample_rate * 60 / 97.0,
+    )
+    expected = np.floor(
+        np.concatenate(([0.0], np.cumsum(samples_per_beat, dtype=np.longdouble)))[
+            :beat_count
+        ]
+        + 0.5
+    ).astype(np.int64)
+    drift = positions - expected
+    print(
+        f"{beat_count} beats, final beat at sample {positions[-1]}, "
+        f"max drift {np.abs(drift).max()} samples"
+    )
+    assert len(positions) == beat_count
+    assert not drift.any()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--bpm", type=float, default=120)
+    parser.add_argument("--beats-per-bar", type=int, default=4)
+    parser.add_argument("--check", action="store_true")
+    args = parser.parse_args()
+    if args.check:
+        check_drift()
+        return
+    scheduler = MetronomeScheduler(BeatGrid(args.bpm, beats_per_bar=args.beats_per_bar))
+    scheduler.start()
+    input("按回车键停止...")
+    scheduler.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,423 @@
+"""
+多声道 (多名玩家) 吉他输入: 每个声道独立做 onset / pitch 检测, hit 记录带上声道编号。
+
+aubio 的检测函数执行期间不释放 GIL, 线程池无法让多个声道并行,
+所以检测放在进程池中: 每个工作进程常驻并持有分给它的声道的检测器 (检测器有状态),
+aubio 只接受连续内存, 所以音频回调在把一个 hop 写入共享内存时顺便解交错
+(按声道连续存放, 每个 hop 只复制这一次), 工作进程直接取各声道的行视图 (不复制) 检测,
+只把 hit 通过管道送回。
+
+回调不等待工作进程: 第 N 个 hop 的回调先用 poll(0) 取回已经完成的结果 (通常是第 N-1 个 hop),
+再写入并发出第 N 个 hop, 所以 hit 比 workers=0 时晚一个 hop 送达。
+共享内存按 hop 的奇偶分为两个槽, 工作进程处理第 N-1 个 hop 时回调写入的是另一个槽;
+工作进程落后两个 hop 以上时它读的槽会被复用, 此时不写它负责的声道, 这个 hop 也不发给它
+(计入 dropped_hops)。退出的工作进程会被重新启动。
+
+进程池每个 hop 都有进程间通信的固定开销, 收益取决于 CPU 数和声道数,
+用 benchmark.py channels 在目标机器上确认收益之前默认 workers=0, 在回调线程中依次检测。
+"""
+
+import logging
+import multiprocessing
+import time
+import weakref
+from multiprocessing.connection import Connection
+from multiprocessing.shared_memory import SharedMemory
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+from numpy.typing import NDArray
+
+from audio_source import GeneratorSource, IAudioSource, PyAudioSource
+from chord import ChordAnalyzer
+from guitar_input import (
+    CHORD_HIT_DTYPE,
+    HIT_DTYPE,
+    ChannelDetector,
+    analyze_chord_windows,
+    chord_window_dtype,
+)
+from ring_buffer import RingBuffer
+
+# HIT_DTYPE 加上声道 (玩家) 编号
+CHANNEL_HIT_DTYPE = np.dtype(HIT_DTYPE.descr + [("channel", np.int16)])
+CHANNEL_CHORD_HIT_DTYPE = np.dtype(CHORD_HIT_DTYPE.descr + [("channel", np.int16)])
+
+
+# 音频流结束时发给工作进程, 取回推迟中的和弦 hit
+_FLUSH = "flush"
+
+
+def _release_workers(
+    processes: List[multiprocessing.Process], shared_memory: SharedMemory
+):
+    """close 未被调用时由 weakref.finalize 在回收或解释器退出时执行"""
+    for process in processes:
+        if process.is_alive():
+            process.terminate()
+    try:
+        shared_memory.close()
+    except BufferError:
+        # 解释器退出时 _planar 视图可能仍然存在, 只要 unlink 就不会泄漏
+        pass
+    shared_memory.unlink()
+
+
+def _create_detector(
+    buffer_size: int, hop_size: int, sample_rate: int, chords: bool
+) -> ChannelDetector:
+    return ChannelDetector(
+        buffer_size,
+        hop_size,
+        sample_rate,
+        ChordAnalyzer(sample_rate) if chords else None,
+    )
+
+
+def _detect_channels(
+    detectors: Sequence[Tuple[int, ChannelDetector]],
+    planar: NDArray[np.float32],
+    hop_start_sample: int,
+    adc_time: float,
+) -> List[Tuple]:
+    """planar 为 (channels, hop_size) 的解交错数据"""
+    hits = []
+    for channel, detector in detectors:
+        hit = detector.process(planar[channel], hop_start_sample, adc_time)
+        if hit is not None:
+            hits.append(hit + (channel,))
+    return hits
+
+
+def _flush_channels(detectors: Sequence[Tuple[int, ChannelDetector]]) -> List[Tuple]:
+    hits = []
+    for channel, detector in detectors:
+        hit = detector.flush()
+        if hit is not None:
+            hits.append(hit + (channel,))
+    return hits
+
+
+def _channel_worker(
+    connection: Connection,
+    shared_memory_name: str,
+    hop_size: int,
+    channel_count: int,
+    channels: Sequence[int],
+    buffer_size: int,
+    sample_rate: int,
+    chords: bool,
+):
+    shared_memory = SharedMemory(shared_memory_name)
+    planar = np.ndarray(
+        (2, channel_count, hop_size), dtype=np.float32, buffer=shared_memory.buf
+    )
+    detectors = [
+        (channel, _create_detector(buffer_size, hop_size, sample_rate, chords))
+        for channel in channels
+    ]
+    # 检测器创建完毕 (aubio 已导入), 通知主进程
+    connection.send([])
+    try:
+        while True:
+            message = connection.recv()
+            if message is None:
+                return
+            if message == _FLUSH:
+                connection.send(_flush_channels(detectors))
+                continue
+            slot, hop_start_sample, adc_time = message
+            connection.send(
+                _detect_channels(detectors, planar[slot], hop_start_sample, adc_time)
+            )
+    finally:
+        del planar
+        shared_memory.close()
+
+
+class MultiChannelGuitarInput:
+    """
+    与 GuitarInput 接口相同, drain_hits 返回 CHANNEL_HIT_DTYPE 记录,
+    chords=True 时为 CHANNEL_CHORD_HIT_DTYPE, 和弦在 drain_hits 中分析。
+    workers > 0 时声道按 channel % workers 分配给工作进程,
+    workers=None 时取声道数和 CPU 数中较小的一个。
+    dropped_hops 为工作进程来不及处理而跳过的 (工作进程, hop) 数,
+    worker_restarts 为工作进程意外退出后重启的次数。
+    """
+
+    def __init__(
+        self,
+        source: Optional[IAudioSource] = None,
+        buffer_size: Optional[int] = None,
+        hit_capacity: int = 1024,
+        workers: Optional[int] = 0,
+        chords: bool = False,
+    ) -> None:
+        self._source = PyAudioSource(channels=2) if source is None else source
+        self._channel_count = self._source.channels
+        self._sample_rate = self._source.sample_rate
+        self._hop_size = self._source.hop_size
+        self._buffer_size = 2 * self._hop_size if buffer_size is None else buffer_size
+        self._chords = chords
+        self._flushed = False
+        # 回调停止后取回的 hit, 由消费者持有, 不写入单生产者的 _hits
+        self._flushed_hits: List[Tuple] = []
+        # 消费者分析和弦用, 各声道检测器里的 ChordAnalyzer 只维护窗口
+        self._chord_analyzer = ChordAnalyzer(self._sample_rate) if chords else None
+        self._hits = RingBuffer(
+            (
+                CHANNEL_HIT_DTYPE
+                if self._chord_analyzer is None
+                else chord_window_dtype(HIT_DTYPE, self._chord_analyzer.fft_size).descr
+                + [("channel", np.int16)]
+            ),
+            hit_capacity,
+        )
+        self._processed_samples = 0
+        if workers is None:
+            workers = min(self._channel_count, multiprocessing.cpu_count())
+        self._workers = min(workers, self._channel_count)
+
+        self._detectors: List[Tuple[int, ChannelDetector]] = []
+        self._connections: List[Connection] = []
+        self._processes: List[multiprocessing.Process] = []
+        # 每个工作进程是否还有未取回的结果, 以及它正在读的槽 (-1 表示不读共享内存)
+        self._busy: List[bool] = []
+        self._busy_slots: List[int] = []
+        self._hop_count = 0
+        self.dropped_hops = 0
+        self.worker_restarts = 0
+        self._shared_memory: Optional[SharedMemory] = None
+        self._finalizer: Optional[weakref.finalize] = None
+        self._planar = np.empty((2, self._channel_count, self._hop_size), np.float32)
+        if self._workers == 0:
+            self._detectors = [
+                (
+                    channel,
+                    _create_detector(
+                        self._buffer_size, self._hop_size, self._sample_rate, chords
+                    ),
+                )
+                for channel in range(self._channel_count)
+            ]
+        else:
+            self._start_workers()
+
+    def _start_workers(self):
+        self._shared_memory = SharedMemory(
+            create=True, size=2 * self._hop_size * self._channel_count * 4
+        )
+        self._planar = np.ndarray(
+            (2, self._channel_count, self._hop_size),
+            dtype=np.float32,
+            buffer=self._shared_memory.buf,
+        )
+        for worker in range(self._workers):
+            connection, process = self._start_worker(worker)
+            self._connections.append(connection)
+            self._processes.append(process)
+            # 就绪消息按一次空结果取回
+            self._busy.append(True)
+            self._busy_slots.append(-1)
+        self._finalizer = weakref.finalize(
+            self, _release_workers, self._processes, self._shared_memory
+        )
+        self._collect(10.0)
+
+    def _start_worker(self, worker: int) -> Tuple[Connection, multiprocessing.Process]:
+        assert self._shared_memory is not None
+        connection, worker_connection = multiprocessing.Pipe()
+        process = multiprocessing.Process(
+            target=_channel_worker,
+            args=(
+                worker_connection,
+                self._shared_memory.name,
+                self._hop_size,
+                self._channel_count,
+                list(range(worker, self._channel_count, self._workers)),
+                self._buffer_size,
+                self._sample_rate,
+                self._chords,
+            ),
+            daemon=True,
+        )
+        process.start()
+        # 只保留父进程一端, 工作进程退出时 recv 立即得到 EOFError
+        worker_connection.close()
+        return connection, process
+
+    def _restart_worker(self, worker: int):
+        """工作进程退出时重新启动, 它负责的声道的检测器状态从头开始"""
+        logging.warning(
+            "channel worker %d exited with %s, restarting",
+            worker,
+            self._processes[worker].exitcode,
+        )
+        self._processes[worker].join()
+        self._connections[worker].close()
+        self._connections[worker], self._processes[worker] = self._start_worker(worker)
+        # 不在音频回调中等待就绪, 之后的回调取回就绪消息前跳过这个工作进程
+        self._busy[worker] = True
+        self._busy_slots[worker] = -1
+        self.worker_restarts += 1
+
+    @property
+    def source(self) -> IAudioSource:
+        return self._source
+
+    @property
+    def channel_count(self) -> int:
+        return self._channel_count
+
+    def _process_hop(self, frames: NDArray[np.float32], adc_time: float):
+        hop_start_sample = self._processed_samples
+        self._processed_samples += len(frames)
+        if not self._connections:
+            # 解交错到预分配的缓冲区; 单声道源的 frames 是一维的, 直接广播
+            planar = self._planar[0]
+            planar[:] = frames.T
+            hits = _detect_channels(self._detectors, planar, hop_start_sample, adc_time)
+        else:
+            hits = self._collect(0)
+            slot = self._hop_count & 1
+            self._write_slot(slot, frames)
+            skipped = self._send((slot, hop_start_sample, adc_time), slot)
+            self.dropped_hops += len(skipped)
+        self._hop_count += 1
+        for hit in hits:
+            self._hits.push(hit)
+
+    def _process_hop_sync(self, frames: NDArray[np.float32], adc_time: float):
+        """process_until 用: 不在音频线程中, 先等工作进程处理完上一个 hop, 不丢 hop"""
+        for hit in self._collect(1.0):
+            self._hits.push(hit)
+        self._process_hop(frames, adc_time)
+
+    def _write_slot(self, slot: int, frames: NDArray[np.float32]):
+        """解交错写入共享内存的 slot, 跳过仍在读这个槽的工作进程负责的声道"""
+        planar = self._planar[slot]
+        stale = [
+            worker
+            for worker, busy in enumerate(self._busy)
+            if busy and self._busy_slots[worker] == slot
+        ]
+        if not stale:
+            planar[:] = frames.T
+            return
+        samples = frames.T
+        for worker in range(self._workers):
+            if worker not in stale:
+                rows = slice(worker, self._channel_count, self._workers)
+                planar[rows] = samples[rows] if samples.ndim == 2 else samples
+
+    def _send(self, message, slot: int = -1) -> List[int]:
+        """发给空闲的工作进程, 返回因上一个结果未取回而跳过的工作进程"""
+        skipped = []
+        for worker, connection in enumerate(self._connections):
+            if self._busy[worker]:
+                skipped.append(worker)
+                continue
+            try:
+                connection.send(message)
+            except OSError:
+                self._restart_worker(worker)
+                skipped.append(worker)
+                continue
+            self._busy[worker] = True
+            self._busy_slots[worker] = slot
+        return skipped
+
+    def _collect(self, timeout_s: float) -> List[Tuple]:
+        """在 timeout_s 之内收集已完成的结果, 并重启已经退出的工作进程"""
+        hits = []
+        deadline = time.perf_counter() + timeout_s
+        for worker, connection in enumerate(self._connections):
+            if not self._busy[worker]:
+                continue
+            if connection.poll(max(deadline - time.perf_counter(), 0)):
+                try:
+                    hits.extend(connection.recv())
+                    self._busy[worker] = False
+                    continue
+                except EOFError:
+                    pass
+            if not self._processes[worker].is_alive():
+                self._restart_worker(worker)
+        return hits
+
+    def _flush(self):
+        """
+        取回推迟中的和弦 hit, 留给下一次 drain_hits; 音频流结束后由消费者执行一次。
+        此时回调不再运行, 可以直接读工作进程的管道
+        """
+        if not self._chords or self._flushed:
+            return
+        self._flushed = True
+        if not self._connections:
+            hits = _flush_channels(self._detectors)
+        else:
+            # 先取回超时未取的结果, 再等待 flush 的结果
+            hits = self._collect(1.0)
+            self._send(_FLUSH)
+            hits += self._collect(1.0)
+        self._flushed_hits.extend(hits)
+
+    def get_time_ms(self) -> float:
+        return self._source.get_time_ms()
+
+    def drain_hits(self) -> NDArray:
+        """返回上次调用以来的所有 CHANNEL_HIT_DTYPE (或 CHANNEL_CHORD_HIT_DTYPE) 记录"""
+        if isinstance(self._source, GeneratorSource) and self._source.finished:
+            self._flush()
+        hits = self._hits.drain()
+        if self._flushed_hits:
+            flushed = np.array(self._flushed_hits, dtype=hits.dtype)
+            self._flushed_hits.clear()
+            hits = np.concatenate((hits, flushed))
+        if self._chord_analyzer is None:
+            return hits
+        return analyze_chord_windows(
+            hits, self._chord_analyzer, CHANNEL_CHORD_HIT_DTYPE
+        )
+
+    def process_until(self, time_ms: float):
+        if not isinstance(self._source, GeneratorSource):
+            raise TypeError(
+                "process_until needs a replay source (GeneratorSource, ArraySource, "
+                f"WavFileSource), got {type(self._source).__name__}"
+            )
+        self._source.process_until(time_ms, self._process_hop_sync)
+        # 取回最后一个 hop 的结果, 与 workers=0 时一样在返回前交付
+        for hit in self._collect(1.0):
+            self._hits.push(hit)
+
+    def on_setup(self):
+        self._source.start(self._process_hop)
+
+    def on_destory(self):
+        self._source.stop()
+        self._flush()
+        self.close()
+
+    def close(self):
+        """结束工作进程并释放共享内存"""
+        for connection in self._connections:
+            try:
+                connection.send(None)
+            except OSError:
+                # 工作进程已经退出
+                pass
+        for process in self._processes:
+            process.join(1.0)
+        if self._finalizer is not None:
+            self._planar = np.empty_like(self._planar)
+            # 终止未按时退出的工作进程, 释放共享内存
+            self._finalizer()
+            self._finalizer = None
+            self._shared_memory = None
+        for connection in self._connections:
+            connection.close()
+        self._connections.clear()
+        self._processes.clear()
+        self._busy.clear()
+        self._busy_slots.clear()
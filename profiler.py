@@ -0,0 +1,133 @@
+import csv
+import json
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pygame
+from numpy.typing import NDArray
+
+
+class FrameProfiler:
+    """
+    用 perf_counter_ns 记录每帧各阶段、各 actor 类型、各事件类型的耗时,
+    每个 key 保存最近 history 帧的耗时 (毫秒) 用于统计分位数、绘制叠加层和导出。
+    关闭时 begin 返回 0, end 直接返回; 按 actor/事件类型的细粒度计时由调用方检查 enabled 跳过。
+    """
+
+    def __init__(self, history: int = 600, enabled: bool = False) -> None:
+        self._history = history
+        self.enabled = enabled
+        self.overlay_visible = False
+        self._frame_count = 0
+        # 本帧尚未提交的累计耗时 (纳秒)
+        self._current: Dict[str, int] = {}
+        self._samples: Dict[str, NDArray[np.float64]] = {}
+        self._overlay_surfaces: List[pygame.Surface] = []
+        self._overlay_sources: List[Callable[[], str]] = []
+        self._font: Optional[pygame.font.Font] = None
+
+    def toggle(self):
+        self.enabled = not self.enabled
+        self.overlay_visible = self.enabled
+
+    def begin(self) -> int:
+        return time.perf_counter_ns() if self.enabled else 0
+
+    def end(self, key: str, start_ns: int):
+        """把从 begin 到现在的耗时累加到 key 上, begin 时未开启则忽略"""
+        if not start_ns:
+            return
+        elapsed = time.perf_counter_ns() - start_ns
+        self._current[key] = self._current.get(key, 0) + elapsed
+
+    def end_frame(self):
+        index = self._frame_count % self._history
+        for key, elapsed in self._current.items():
+            samples = self._samples.get(key)
+            if samples is None:
+                samples = np.full(self._history, np.nan)
+                samples[: min(self._frame_count, self._history)] = 0
+                self._samples[key] = samples
+            samples[index] = elapsed / 1e6
+        for key, samples in self._samples.items():
+            if key not in self._current:
+                samples[index] = 0
+        self._current.clear()
+        self._frame_count += 1
+
+    def add_overlay_source(self, source: Callable[[], str]):
+        """叠加层末尾追加一行不按帧统计的状态 (如音频回调统计), 与表格同时刷新"""
+        self._overlay_sources.append(source)
+
+    def get_keys(self) -> List[str]:
+        return sorted(self._samples)
+
+    def get_stats(self, key: str) -> Tuple[float, float, float, float]:
+        """p50, p95, p99, max"""
+        samples = self._samples[key]
+        samples = samples[~np.isnan(samples)]
+        p50, p95, p99 = np.percentile(samples, (50, 95, 99))
+        return float(p50), float(p95), float(p99), float(samples.max())
+
+    def _get_ordered_samples(self) -> Dict[str, NDArray[np.float64]]:
+        """按帧的先后顺序排列, 去掉尚未写入的帧"""
+        if self._frame_count < self._history:
+            return {
+                key: samples[: self._frame_count]
+                for key, samples in sorted(self._samples.items())
+            }
+        start = self._frame_count % self._history
+        return {
+            key: np.roll(samples, -start)
+            for key, samples in sorted(self._samples.items())
+        }
+
+    def export(self, path: str):
+        """按扩展名导出为 .csv (每帧一行) 或 .json"""
+        samples = self._get_ordered_samples()
+        first_frame = self._frame_count - min(self._frame_count, self._history)
+        if path.endswith(".csv"):
+            with open(path, "w", newline="") as f:
+                writer = csv.writer(f)
+                writer.writerow(["frame", *samples])
+                for i, row in enumerate(zip(*samples.values())):
+                    writer.writerow([first_frame + i, *(f"{v:.4f}" for v in row)])
+        else:
+            with open(path, "w") as f:
+                json.dump(
+                    {
+                        "first_frame": first_frame,
+                        "unit": "ms",
+                        "stats": {key: self.get_stats(key) for key in samples},
+                        "frames": {
+                            key: values.tolist() for key, values in samples.items()
+                        },
+                    },
+                    f,
+                )
+
+    def draw_overlay(self, surface: pygame.Surface):
+        if not self.overlay_visible or not self._samples:
+            return
+        # 文字每半秒重新渲染一次
+        if self._frame_count % 30 == 0 or not self._overlay_surfaces:
+            self._render_overlay()
+        y = 4
+        for line in self._overlay_surfaces:
+            surface.blit(line, (4, y))
+            y += line.get_height()
+
+    def _render_overlay(self):
+        if self._font is None:
+            pygame.font.init()
+            self._font = pygame.font.SysFont("monospace", 14)
+        lines = [f"{'key':<28}{'p50':>8}{'p99':>8}{'max':>8}"]
+        for key in self.get_keys():
+            p50, _, p99, worst = self.get_stats(key)
+            lines.append(f"{key:<28}{p50:>8.2f}{p99:>8.2f}{worst:>8.2f}")
+        lines.extend(source() for source in self._overlay_sources)
+        self._overlay_surfaces = [
+            self._font.render(line, True, pygame.Color("black"), pygame.Color("white"))
+            for line in lines
+        ]
@@ -0,0 +1,109 @@
+from typing import Iterable, List, Optional, Sequence
+
+import pygame
+
+
+class DirtyRectSurface(pygame.Surface):
+    """
+    离屏绘制目标, 像素格式与屏幕相同。它是真正的 pygame.Surface,
+    可以直接传给 pygame.draw 或作为其他 blit 的源。
+    blit/blits 记录实际写入的区域, 渲染器据此知道这一帧哪些区域变脏了;
+    用 pygame.draw 等其他方式绘制时需要调用 mark_dirty 登记, 否则不会提交到屏幕。
+    """
+
+    def __init__(self, screen: pygame.Surface) -> None:
+        super().__init__(screen.get_size(), 0, screen)
+        self.dirty_rects: List[pygame.Rect] = []
+
+    def blit(self, source, dest, area=None, special_flags=0):
+        rect = super().blit(source, dest, area, special_flags)
+        self.dirty_rects.append(rect)
+        return rect
+
+    def blits(self, blit_sequence, doreturn=True):
+        rects = super().blits(blit_sequence, doreturn=True)
+        self.dirty_rects.extend(rects)
+        return rects if doreturn else None
+
+    def mark_dirty(self, rect: pygame.Rect):
+        self.dirty_rects.append(rect)
+
+
+class DirtyRectRenderer:
+    """
+    缓存静态背景层, 每帧在离屏的 DirtyRectSurface 上只用背景擦除上一帧画过的区域,
+    再把上一帧和这一帧的脏矩形复制到屏幕并用 display.update 提交, 代替整屏 fill + flip。
+    脏区域的总面积超过屏幕的 full_redraw_ratio 时 (精灵很多), 逐个擦除和提交
+    反而更慢, 此时退回整屏擦除和 flip。
+    """
+
+    def __init__(
+        self,
+        screen: pygame.Surface,
+        background: Optional[pygame.Surface] = None,
+        full_redraw_ratio: float = 0.5,
+    ) -> None:
+        self._screen = screen
+        if background is None:
+            background = pygame.Surface(screen.get_size())
+            background.fill(pygame.Color("white"))
+        self._background = (
+            background.convert() if pygame.display.get_surface() else background
+        )
+        self._screen_area = screen.get_width() * screen.get_height()
+        self._full_redraw_ratio = full_redraw_ratio
+        self._target = DirtyRectSurface(screen)
+        self._previous_rects: List[pygame.Rect] = []
+        self._full_redraw = True
+        # 上一帧脏区域太大, 这一帧直接整屏擦除
+        self._erase_all = False
+
+    def set_background(self, background: pygame.Surface):
+        self._background = background
+        self.invalidate()
+
+    def invalidate(self):
+        """下一帧整屏重绘, 例如背景变化或窗口被覆盖后"""
+        self._full_redraw = True
+
+    def begin_frame(self) -> DirtyRectSurface:
+        """擦除上一帧画过的区域, 返回这一帧用于绘制的 Surface"""
+        target = self._target
+        if self._full_redraw or self._erase_all:
+            target.blit(self._background, (0, 0))
+        else:
+            background = self._background
+            target.blits(
+                [(background, rect, rect) for rect in self._previous_rects],
+                doreturn=False,
+            )
+        self._target.dirty_rects = []
+        return self._target
+
+    def draw_debug_rects(self, rects: Sequence[pygame.Rect], color="red"):
+        """一次性画出所有调试矩形 (如碰撞盒) 并登记为脏区域"""
+        surface = self._target
+        color = pygame.Color(color)
+        mark_dirty = self._target.mark_dirty
+        for rect in rects:
+            mark_dirty(pygame.draw.rect(surface, color, rect, 1))
+
+    def present(self):
+        # blit 返回的矩形已经裁剪到屏幕内
+        current_rects = self._target.dirty_rects
+        too_dirty = self._needs_full_redraw(current_rects)
+        if self._full_redraw or too_dirty:
+            self._screen.blit(self._target, (0, 0))
+            pygame.display.flip()
+        else:
+            rects = self._previous_rects + current_rects
+            target = self._target
+            self._screen.blits([(target, rect, rect) for rect in rects], doreturn=False)
+            pygame.display.update(rects)
+        self._full_redraw = False
+        self._erase_all = too_dirty
+        self._previous_rects = current_rects
+
+    def _needs_full_redraw(self, rects: Iterable[pygame.Rect]) -> bool:
+        area = sum(rect.width * rect.height for rect in rects)
+        return area > self._screen_area * self._full_redraw_ratio
@@ -0,0 +1,58 @@
+from typing import Tuple
+import numpy as np
+from numpy.typing import DTypeLike, NDArray
+
+
+class RingBuffer:
+    """
+    单生产者 / 单消费者的定长环形缓冲区, 存储 NumPy 结构化记录。
+
+    生产者 (音频回调线程) 只写 _write_count, 消费者 (游戏循环) 只写 _read_count,
+    计数单调递增且在 GIL 下整数赋值是原子的, 因此两端都不需要加锁。
+    存储在构造时一次性分配, push 不会分配内存; 缓冲区满时丢弃新记录并计数。
+    """
+
+    def __init__(self, dtype: DTypeLike, capacity: int) -> None:
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+        self._buffer = np.zeros(capacity, dtype=dtype)
+        self._capacity = capacity
+        self._write_count = 0
+        self._read_count = 0
+        self._dropped_count = 0
+
+    @property
+    def capacity(self) -> int:
+        return self._capacity
+
+    @property
+    def dropped_count(self) -> int:
+        return self._dropped_count
+
+    def __len__(self) -> int:
+        return self._write_count - self._read_count
+
+    def push(self, record: Tuple) -> bool:
+        """生产者调用; 写入记录后才发布新的 _write_count"""
+        write_count = self._write_count
+        if write_count - self._read_count >= self._capacity:
+            self._dropped_count += 1
+            return False
+        self._buffer[write_count % self._capacity] = record
+        self._write_count = write_count + 1
+        return True
+
+    def drain(self) -> NDArray:
+        """消费者调用; 取出当前所有记录的副本"""
+        read_count = self._read_count
+        write_count = self._write_count
+        start = read_count % self._capacity
+        stop = start + (write_count - read_count)
+        if stop <= self._capacity:
+            records = self._buffer[start:stop].copy()
+        else:
+            records = np.concatenate(
+                (self._buffer[start:], self._buffer[: stop - self._capacity])
+            )
+        self._read_count = write_count
+        return records
@@ -0,0 +1,138 @@
+from typing import Dict, List, Sequence, Tuple, Type
+
+import numpy as np
+import pygame
+from numpy.typing import NDArray
+
+from base import ICamera, IActor, IBatchCullable, IComponent
+
+
+class SpriteBatch(IActor, IBatchCullable):
+    """
+    同类 actor (滚动的音符、金币) 的数组存储: 位置、速度和精灵编号各存一个 NumPy 数组,
+    每帧用一次向量化积分更新所有位置, 用一个可见性掩码剔除屏幕外的精灵后批量 blit。
+    槽位用空闲列表复用, 容量不足时翻倍。
+    """
+
+    def __init__(self, sprites: Sequence[pygame.Surface], capacity: int = 256) -> None:
+        self._component_dict: Dict[Type[IComponent], IComponent] = {}
+        self._sprites = list(sprites)
+        self._sprite_sizes = np.array([s.get_size() for s in sprites], dtype=np.float64)
+        self._positions = np.zeros((capacity, 2))
+        # 上一个模拟步的位置, 渲染时插值用
+        self._previous_positions = np.zeros((capacity, 2))
+        self._velocities = np.zeros((capacity, 2))
+        self._sprite_ids = np.zeros(capacity, dtype=np.int32)
+        self._alive = np.zeros(capacity, dtype=bool)
+        # 曾经使用过的槽位数, 数组运算只作用于 [:_size]
+        self._size = 0
+        self._free: List[int] = []
+
+    def _get_component_dict(self) -> Dict[Type[IComponent], IComponent]:
+        return self._component_dict
+
+    def __len__(self) -> int:
+        return self._size - len(self._free)
+
+    @property
+    def positions(self) -> NDArray[np.float64]:
+        return self._positions[: self._size]
+
+    @property
+    def alive(self) -> NDArray[np.bool_]:
+        return self._alive[: self._size]
+
+    def _grow(self):
+        capacity = len(self._alive) * 2
+        for name in (
+            "_positions",
+            "_previous_positions",
+            "_velocities",
+            "_sprite_ids",
+            "_alive",
+        ):
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[: len(old)] = old
+            setattr(self, name, new)
+
+    def spawn(
+        self,
+        position: Tuple[float, float],
+        velocity: Tuple[float, float] = (0, 0),
+        sprite_id: int = 0,
+    ) -> int:
+        if self._free:
+            index = self._free.pop()
+        else:
+            if self._size == len(self._alive):
+                self._grow()
+            index = self._size
+            self._size += 1
+        self._positions[index] = position
+        self._previous_positions[index] = position
+        self._velocities[index] = velocity
+        self._sprite_ids[index] = sprite_id
+        self._alive[index] = True
+        return index
+
+    def despawn(self, indexes: NDArray):
+        indexes = np.asarray(indexes, dtype=np.int64)
+        indexes = indexes[self._alive[indexes]]
+        self._alive[indexes] = False
+        # 死亡槽位的速度清零, 积分时不再移动
+        self._velocities[indexes] = 0
+        self._free.extend(indexes.tolist())
+
+    def update_self(self, delta_time_ms: int):
+        size = self._size
+        self._previous_positions[:size] = self._positions[:size]
+        self._positions[:size] += self._velocities[:size] * delta_time_ms
+
+    def get_bounds(self) -> NDArray[np.float64]:
+        """每个槽位的 (left, top, right, bottom)"""
+        positions = self._positions[: self._size]
+        sizes = self._sprite_sizes[self._sprite_ids[: self._size]]
+        return np.concatenate((positions, positions + sizes), axis=1)
+
+    def query_rect(self, rect: pygame.Rect, bounds=None) -> NDArray[np.bool_]:
+        """与 rect 相交的存活槽位的掩码, 与 pygame.Rect.colliderect 的规则一致"""
+        if bounds is None:
+            bounds = self.get_bounds()
+        return (
+            self._alive[: self._size]
+            & (bounds[:, 0] < rect.right)
+            & (rect.left < bounds[:, 2])
+            & (bounds[:, 1] < rect.bottom)
+            & (rect.top < bounds[:, 3])
+        )
+
+    def despawn_outside(self, keep_rect: pygame.Rect) -> int:
+        outside = np.flatnonzero(
+            self._alive[: self._size] & ~self.query_rect(keep_rect)
+        )
+        if len(outside):
+            self.despawn(outside)
+        return len(outside)
+
+    def get_visible_mask(self, camera: ICamera) -> NDArray[np.bool_]:
+        return self._alive[: self._size] & camera.cull_bounds(self.get_bounds())
+
+    def draw_self(self, surface: pygame.Surface, camera: ICamera):
+        indexes = np.flatnonzero(self.get_visible_mask(camera))
+        if len(indexes) == 0:
+            return
+        previous = self._previous_positions[indexes]
+        screen_positions = camera.world_positions_to_screen(
+            previous + (self._positions[indexes] - previous) * camera.get_render_alpha()
+        )
+        sprites = self._sprites
+        surface.blits(
+            [
+                (sprites[sprite_id], position)
+                for sprite_id, position in zip(
+                    self._sprite_ids[indexes].tolist(), screen_positions.tolist()
+                )
+            ],
+            doreturn=False,
+        )